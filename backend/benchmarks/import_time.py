@@ -0,0 +1,79 @@
+"""Cold-start benchmark: how long does ``import main`` take in a fresh interpreter?
+
+Run from the backend directory:
+
+    python benchmarks/import_time.py --runs 5 --output benchmarks/results/import_time.json
+
+Each run spawns a new interpreter with ``-X importtime`` so nothing is cached
+in-process. The slowest modules of the last run are reported too.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_once():
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"import main failed:\n{completed.stderr[-2000:]}")
+    return elapsed, completed.stderr
+
+
+def slowest_modules(importtime_log: str, top: int, max_depth: int = 2):
+    # Lines look like: "import time:  self [us] | cumulative | <2 spaces per nesting level>package"
+    modules = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= max_depth:
+            modules.append({"module": name.strip(), "depth": depth, "cumulative_ms": int(cumulative_us) / 1000})
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    timings = []
+    log = ""
+    for _ in range(args.runs):
+        elapsed, log = run_once()
+        timings.append(elapsed)
+
+    result = {
+        "benchmark": "import_main",
+        "runs": args.runs,
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+        "slowest_imports": slowest_modules(log, args.top),
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""End-to-end load test of main:app with stubbed LLMs and a seeded database.
+
+    python benchmarks/load_test.py --students 1000 --threads 200 --concurrency 16 --duration 10 \
+        --output benchmarks/results/load_test.json
+    python benchmarks/load_test.py --compare benchmarks/results/load_test.json
+
+The app runs in a child process (``--serve`` mode of this script) with
+``LLM_PROVIDERS=stub`` and ``RAG_LLM_PROVIDERS=stub``, so Gemini and Groq are
+replaced by the in-process stub with ``--llm-latency-ms`` before the first
+token and ``--llm-token-delay-ms`` between tokens. The database is an
+in-memory mongomock instance by default (``pip install mongomock``), or any
+MongoDB given with ``--mongo-url`` (e.g. a local ``mongod``; the database is
+dropped and reseeded).
+
+Before the clock starts, the server is seeded with ``--students`` students and
+``--users`` users who own ``--threads`` chat threads between them, and every
+user logs in once. Each scenario then runs for ``--duration`` seconds with
+``--concurrency`` clients: register, login, students, students_stats, chat and
+chat_stream. Reported per scenario: RPS, p50/p95/p99 latency, errors and, for
+chat_stream, time to first token (first ``delta`` event).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("register", "login", "students", "students_stats", "chat", "chat_stream")
+PASSWORD = "load-test-password"
+API_KEY = "load-test-api-key"
+# Compared with --compare: fail when RPS drops or p95 grows by more than this
+DEFAULT_TOLERANCE = 0.2
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def user_email(i: int) -> str:
+    return f"load-user-{i}@bench.local"
+
+
+# ------------------ Server side (child process) ------------------
+
+def seed(db, students: int, users: int, threads: int, messages_per_thread: int, rounds: int):
+    from datetime import datetime, timedelta
+
+    from bson import ObjectId
+    from utils.password_hashing import hash_password
+
+    for name in ("students", "signup", "threads", "chats", "refresh_tokens"):
+        db[name].drop()
+
+    departments = ["Computer Science", "Mathematics", "Physics", "Biology", "History", "Economics"]
+    if students:
+        db["students"].insert_many([
+            {"id": i, "name": f"Student {i}", "email": f"student{i}@bench.local",
+             "department": departments[i % len(departments)]}
+            for i in range(students)
+        ])
+
+    # One hash shared by every seeded user: seeding must not cost users x bcrypt
+    hashed = hash_password(PASSWORD, rounds)
+    user_ids = [ObjectId() for _ in range(users)]
+    db["signup"].insert_many([
+        {"_id": user_ids[i], "name": f"Load User {i}", "email": user_email(i), "password": hashed}
+        for i in range(users)
+    ])
+
+    started = datetime.utcnow() - timedelta(days=1)
+    thread_docs, chat_docs = [], []
+    for t in range(threads):
+        user_id = str(user_ids[t % users])
+        thread_id = ObjectId()
+        thread_docs.append({"_id": thread_id, "user_id": user_id, "title": f"Thread {t}",
+                            "created_at": started + timedelta(seconds=t)})
+        for m in range(messages_per_thread):
+            chat_docs.append({
+                "user_id": user_id,
+                "thread_id": str(thread_id),
+                "role": "user" if m % 2 == 0 else "assistant",
+                "content": f"Seeded message {m} in thread {t} about student records.",
+                "timestamp": started + timedelta(seconds=t, milliseconds=m),
+            })
+    if thread_docs:
+        db["threads"].insert_many(thread_docs)
+    if chat_docs:
+        db["chats"].insert_many(chat_docs)
+
+
+def serve(args):
+    """Seed the database and run main:app in this process."""
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import config.database as database
+
+    if not args.mongo_url:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("The in-memory database needs mongomock (pip install mongomock), or pass --mongo-url")
+        database._client = mongomock.MongoClient()
+
+    seed(database.get_db(), args.students, args.users, args.threads, args.messages_per_thread, args.bcrypt_rounds)
+
+    import uvicorn
+    from main import app
+
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def server_env(args) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "LLM_PROVIDERS": "stub",
+        "RAG_LLM_PROVIDERS": "stub",
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "STUB_LLM_TOKEN_DELAY_MS": str(args.llm_token_delay_ms),
+        "API_KEY": API_KEY,
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "BCRYPT_TARGET_MS": "0",
+        "LOG_LEVEL": env.get("LOG_LEVEL", "WARNING"),
+    })
+    env.setdefault("SECRET_KEY", "load-test-secret-key-0123456789abcdef")
+    if args.mongo_url:
+        env["DATABASE_URL"] = args.mongo_url
+    if not args.admission_limits:
+        # Measure the app, not the per-user rate limiter
+        env.update({"AGENT_RATE_PER_MINUTE": "1000000", "AGENT_RATE_BURST": "1000000",
+                    "AGENT_MAX_CONCURRENT_PER_USER": "1000", "AGENT_MAX_CONCURRENT": "1000"})
+    return env
+
+
+# ------------------ Client side ------------------
+
+async def wait_until_healthy(base_url: str, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/healthz")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become healthy")
+
+
+class Session:
+    """Logged-in seeded users, shared round-robin by the load clients."""
+
+    def __init__(self, users):
+        self.users = users  # [{"token", "threads"}]
+        self._next_user = itertools.cycle(range(len(users)))
+        self._next_register = itertools.count()
+
+    def user(self) -> dict:
+        return self.users[next(self._next_user)]
+
+    def login_email(self) -> str:
+        return user_email(next(self._next_user))
+
+    def new_email(self) -> str:
+        return f"load-register-{os.getpid()}-{next(self._next_register)}@bench.local"
+
+
+async def login(client: httpx.AsyncClient, email: str) -> httpx.Response:
+    return await client.post("/auth/login", json={"email": email, "password": PASSWORD},
+                             headers={"x-api-key": API_KEY})
+
+
+async def log_in_users(client: httpx.AsyncClient, users: int) -> Session:
+    session_users = []
+    for i in range(users):
+        response = await login(client, user_email(i))
+        token = response.json()["data"]["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        threads = (await client.get("/chat/threads", headers=headers)).json()["threads"]
+        session_users.append({"headers": headers, "threads": [t["id"] for t in threads]})
+    return Session(session_users)
+
+
+def chat_body(user: dict) -> dict:
+    thread_id = user["threads"][0] if user["threads"] else None
+    return {"user_input": "How many students are in Computer Science?", "thread_id": thread_id}
+
+
+async def one_request(scenario: str, client: httpx.AsyncClient, session: Session):
+    """Run one request. Returns ``(ok, ttft_seconds_or_None)``."""
+    if scenario == "register":
+        response = await client.post("/auth/register", json={
+            "name": "Load Register", "email": session.new_email(), "password": PASSWORD,
+        })
+        return response.status_code == 200 and response.json().get("status") == "success", None
+    if scenario == "login":
+        response = await login(client, session.login_email())
+        return response.status_code == 200 and response.json().get("status") == "success", None
+
+    user = session.user()
+    if scenario == "students":
+        response = await client.get("/students", headers=user["headers"])
+        return response.status_code == 200, None
+    if scenario == "students_stats":
+        response = await client.get("/students/stats", headers=user["headers"])
+        return response.status_code == 200, None
+    if scenario == "chat":
+        response = await client.post("/chat/", json=chat_body(user), headers=user["headers"])
+        return response.status_code == 200, None
+
+    # chat_stream: time to first token is the first "delta" event
+    started = time.perf_counter()
+    ttft = None
+    ok = False
+    async with client.stream("POST", "/chat/stream", json=chat_body(user), headers=user["headers"]) as response:
+        if response.status_code != 200:
+            return False, None
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") == "delta" and ttft is None:
+                ttft = time.perf_counter() - started
+            elif event.get("type") == "error":
+                return False, ttft
+            elif event.get("type") == "done":
+                ok = True
+    return ok, ttft
+
+
+async def drive(base_url: str, scenario: str, session: Session, concurrency: int, duration: float) -> dict:
+    latencies, ttfts = [], []
+    errors = 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    ok, ttft = await one_request(scenario, client, session)
+                except (httpx.HTTPError, ValueError, KeyError):
+                    ok, ttft = False, None
+                if not ok:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    def ms(samples, pct):
+        value = percentile(samples, pct)
+        return round(value * 1000, 2) if value is not None else None
+
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": ms(latencies, 50),
+        "p95_ms": ms(latencies, 95),
+        "p99_ms": ms(latencies, 99),
+    }
+    if scenario == "chat_stream":
+        result.update({"ttft_p50_ms": ms(ttfts, 50), "ttft_p95_ms": ms(ttfts, 95), "ttft_p99_ms": ms(ttfts, 99)})
+    return result
+
+
+async def run_scenarios(base_url: str, args) -> dict:
+    await wait_until_healthy(base_url)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        session = await log_in_users(client, args.users)
+
+    results = {}
+    for scenario in args.scenarios:
+        if args.warmup:
+            await drive(base_url, scenario, session, args.concurrency, args.warmup)
+        results[scenario] = await drive(base_url, scenario, session, args.concurrency, args.duration)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose RPS fell, or p95 rose, by more than ``tolerance`` against the baseline."""
+    regressions = []
+    for scenario, current in results.items():
+        before = baseline.get("results", {}).get(scenario)
+        if not before:
+            continue
+        if before["rps"] and current["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: rps {before['rps']} -> {current['rps']}")
+        for key in ("p95_ms", "ttft_p95_ms"):
+            if before.get(key) and current.get(key) and current[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{scenario}: {key} {before[key]} -> {current[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=8, help="seeded users the clients log in as")
+    parser.add_argument("--threads", type=int, default=200)
+    parser.add_argument("--messages-per-thread", type=int, default=10)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="stub LLM time to first token")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=10, help="stub LLM delay between tokens")
+    parser.add_argument("--mongo-url", help="use this MongoDB instead of in-memory mongomock")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--admission-limits", action="store_true",
+                        help="keep the default per-user agent rate limits (off by default)")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    port = free_port()
+    child_args = [
+        "--serve", "--port", str(port),
+        "--students", str(args.students), "--users", str(args.users), "--threads", str(args.threads),
+        "--messages-per-thread", str(args.messages_per_thread), "--bcrypt-rounds", str(args.bcrypt_rounds),
+    ]
+    if args.mongo_url:
+        child_args += ["--mongo-url", args.mongo_url]
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), *child_args],
+                              cwd=BACKEND_DIR, env=server_env(args))
+    try:
+        results = asyncio.run(run_scenarios(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    print(f"{'scenario':<15} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ttft p50':>9} {'errors':>7}")
+    for scenario, r in results.items():
+        print(f"{scenario:<15} {r['rps']:>9.1f} {r['p50_ms'] or 0:>9.1f} {r['p95_ms'] or 0:>9.1f} "
+              f"{r['p99_ms'] or 0:>9.1f} {r.get('ttft_p50_ms') or 0:>9.1f} {r['errors']:>7}")
+
+    report = {
+        "benchmark": "load_test",
+        "config": {
+            "students": args.students, "users": args.users, "threads": args.threads,
+            "messages_per_thread": args.messages_per_thread, "concurrency": args.concurrency,
+            "duration_s": args.duration, "llm_latency_ms": args.llm_latency_ms,
+            "llm_token_delay_ms": args.llm_token_delay_ms, "bcrypt_rounds": args.bcrypt_rounds,
+            "database": "mongodb" if args.mongo_url else "mongomock", "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Microbenchmarks for the RAG, serialization, SSE and auth hot paths.
+
+    python benchmarks/microbench.py --output benchmarks/results/microbench.json
+    python benchmarks/microbench.py --compare benchmarks/results/microbench.json
+    python benchmarks/microbench.py --only rag_context fetch_students
+
+Cases (each at several sizes):
+
+- ``load_documents``   chunking a large text corpus (MB/s, chunks/s)
+- ``rag_context``      building the rag_query context from 1k/10k/100k chunks
+- ``fetch_students``   fetch_students_data on 100..100k rows decoded from real
+                       BSON, then encoding the /students response body
+- ``sse_event``        one /chat/stream delta frame
+- ``get_current_user`` token verification, cache hit and cache miss
+
+Every result carries the regression threshold it is checked against.
+``--compare`` re-runs the suite and exits 1 when a case's fastest round is
+slower than the baseline's by more than that threshold.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+os.environ.setdefault("SECRET_KEY", "microbench-secret-key-0123456789abcdef")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# Allowed slowdown of the fastest round (min_ms) against the baseline, per
+# case. Cases that do little work per call are noisier and get more room.
+THRESHOLDS = {
+    "load_documents": 0.25,
+    "rag_context": 0.25,
+    "fetch_students": 0.25,
+    "sse_event": 0.35,
+    "get_current_user": 0.35,
+}
+
+
+def measure(fn, repeat: int, min_time: float = 0.2) -> dict:
+    """timeit-style: pick a loop count that takes ``min_time``, then time ``repeat`` rounds."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time or number >= 1_000_000:
+            break
+        number *= 10
+
+    per_call = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - started) / number)
+    per_call.sort()
+    return {
+        "median_ms": statistics.median(per_call) * 1000,
+        "min_ms": per_call[0] * 1000,
+        "max_ms": per_call[-1] * 1000,
+        "loops": number,
+    }
+
+
+# ------------------ Cases ------------------
+
+def bench_load_documents(repeat: int):
+    from tools.general_info import load_documents
+
+    with open("university.txt", encoding="utf-8") as f:
+        seed_text = f.read()
+    for size_mb in (1, 10):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8", delete=False) as f:
+            copies = max(1, int(size_mb * 1024 * 1024 / len(seed_text.encode("utf-8"))))
+            f.write("\n\n".join([seed_text] * copies))
+            path = f.name
+        try:
+            chunks = len(load_documents(path))
+            result = measure(lambda: load_documents(path), repeat)
+        finally:
+            os.unlink(path)
+        seconds = result["median_ms"] / 1000
+        yield {"size_mb": size_mb}, {
+            **result, "chunks": chunks, "mb_per_s": size_mb / seconds, "chunks_per_s": chunks / seconds,
+        }
+
+
+def bench_rag_context(repeat: int):
+    from langchain_core.documents import Document
+    from tools.general_info import build_context
+
+    chunk = "The university offers undergraduate and graduate programs across six faculties. " * 6
+    for chunks in (1_000, 10_000, 100_000):
+        docs = [Document(page_content=f"{i} {chunk}") for i in range(chunks)]
+        yield {"chunks": chunks}, measure(lambda: build_context(docs), repeat)
+
+
+class _BsonCollection:
+    """Returns documents decoded from BSON on every query, as pymongo does.
+
+    The documents are stored with a string ``_id``, as the projection in
+    fetch_students_data returns them from MongoDB.
+    """
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+
+    def aggregate(self, *args, **kwargs):
+        import bson
+
+        return iter(bson.decode_all(self.raw))
+
+
+def bench_fetch_students(repeat: int):
+    import bson
+    from bson import ObjectId
+    import routes.students_routes as students_routes
+    from utils.json_response import FastJSONResponse
+
+    departments = ["Computer Science", "Mathematics", "Physics", "Biology", "History", "Economics"]
+    real_get_db = students_routes.get_db
+    try:
+        for rows in (100, 1_000, 10_000, 100_000):
+            raw = b"".join(
+                bson.encode({"_id": str(ObjectId()), "id": i, "name": f"Student {i}",
+                             "email": f"student{i}@example.edu", "department": departments[i % 6]})
+                for i in range(rows)
+            )
+            students_routes.get_db = lambda: {"students": _BsonCollection(raw)}
+
+            def fetch_and_encode():
+                result = students_routes.fetch_students_data()
+                FastJSONResponse({"Data": result["Data"], "total": len(result["Data"])})
+
+            fetch = measure(students_routes.fetch_students_data, repeat)
+            total = measure(fetch_and_encode, repeat)
+            yield {"rows": rows}, {
+                **total,
+                "fetch_median_ms": fetch["median_ms"],
+                "rows_per_s": rows / (total["median_ms"] / 1000),
+            }
+    finally:
+        students_routes.get_db = real_get_db
+
+
+def bench_sse_event(repeat: int):
+    from routes.chat_routs import sse_event
+
+    for label, payload in (
+        ("delta", {"type": "delta", "content": "Computer Science "}),
+        ("done", {"type": "done", "full_response": "The department has 42 students. " * 30}),
+    ):
+        yield {"frame": label}, measure(lambda: sse_event(payload), repeat)
+
+
+def _run_sync(coro):
+    """Drive a coroutine that never suspends, without event-loop overhead."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    raise RuntimeError("coroutine suspended")
+
+
+def bench_get_current_user(repeat: int):
+    from utils import auth_utils
+
+    token = auth_utils.create_access_token({"email": "a@example.edu", "name": "A", "user_id": "bench-user"})
+    auth_utils._token_cache.clear()
+    yield {"path": "cache_hit"}, measure(lambda: _run_sync(auth_utils.get_current_user(token)), repeat)
+
+    def miss():
+        auth_utils._token_cache.clear()
+        return _run_sync(auth_utils.get_current_user(token))
+
+    yield {"path": "cache_miss"}, measure(miss, repeat)
+    auth_utils._token_cache.clear()
+
+
+CASES = {
+    "load_documents": bench_load_documents,
+    "rag_context": bench_rag_context,
+    "fetch_students": bench_fetch_students,
+    "sse_event": bench_sse_event,
+    "get_current_user": bench_get_current_user,
+}
+
+
+def case_key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in result["params"].items())
+    return f"{result['case']}[{params}]"
+
+
+def compare(results: list, baseline: dict) -> list:
+    before = {case_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = before.get(case_key(result))
+        if not old:
+            continue
+        threshold = old.get("threshold", THRESHOLDS[result["case"]])
+        # The fastest round is the least disturbed by other load on the machine
+        if result["min_ms"] > old["min_ms"] * (1 + threshold):
+            regressions.append(
+                f"{case_key(result)}: {old['min_ms']:.4f} ms -> {result['min_ms']:.4f} ms "
+                f"(+{result['min_ms'] / old['min_ms'] - 1:.0%}, threshold {threshold:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="run only these cases")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON to compare against; exits 1 on regression")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.only or CASES:
+        for params, measured in CASES[name](args.repeat):
+            result = {"case": name, "params": params, **measured, "threshold": THRESHOLDS[name]}
+            results.append(result)
+            print(f"{case_key(result):<40} {result['median_ms']:>12.4f} ms  (x{result['loops']})")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "microbench",
+                "python": sys.version.split()[0],
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Latency of an agent turn that looks up several students at once.
+
+    python benchmarks/tool_calls.py --lookups 1 3 5 --db-latency-ms 50 --llm-latency-ms 20 \
+        --output benchmarks/results/tool_calls.json
+
+The triage agent runs against the stub provider, which answers "student ids
+1, 2 and 3" by calling ``read_student_by_id`` once per id (see
+config/llm_stub.py). Every database call is delayed by ``--db-latency-ms`` to
+stand in for a remote or busy MongoDB. The students live in an in-memory
+mongomock database (``pip install mongomock``), or in the MongoDB given with
+``--mongo-url``, which is read through the real async driver. Three
+configurations are measured:
+
+    parallel    async tools, parallel_tool_calls=True (the app's settings)
+    sequential  async tools, parallel_tool_calls=False: one tool call per model round trip
+    blocking    the previous synchronous read_student_by_id, parallel_tool_calls=True
+
+With ``parallel``, a turn with N lookups should take about as long as a turn
+with one, because the calls overlap. ``blocking`` grows by one database
+round trip per lookup, and ``sequential`` grows by a model round trip as well.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+CONFIGURATIONS = ("parallel", "sequential", "blocking")
+
+
+class DelayedCollection:
+    """Wraps a collection so every call first waits ``latency`` seconds.
+
+    ``inner`` may be synchronous (pymongo, mongomock) or asynchronous; the
+    wrapper is asynchronous unless ``blocking`` is set, in which case it
+    sleeps the calling thread as a synchronous driver would.
+    """
+
+    def __init__(self, inner, latency: float, blocking: bool = False):
+        self.inner = inner
+        self.latency = latency
+        self.blocking = blocking
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+        if self.blocking:
+            def call(*args, **kwargs):
+                time.sleep(self.latency)
+                return method(*args, **kwargs)
+            return call
+
+        async def acall(*args, **kwargs):
+            await asyncio.sleep(self.latency)
+            result = method(*args, **kwargs)
+            return await result if asyncio.iscoroutine(result) else result
+        return acall
+
+
+def build_agents(collection, latency: float):
+    from agents import ModelSettings, function_tool
+
+    import tools.crud_tool as crud_tool
+    from student_agent.agent_help import get_triage_agent
+
+    crud_tool.get_collection = lambda: DelayedCollection(collection["async"], latency)
+    blocking_collection = DelayedCollection(collection["sync"], latency, blocking=True)
+
+    @function_tool
+    def read_student_by_id(id: int):
+        """Fetch a student by their numeric id from the database.
+        Args:
+            id (int): The numeric id of the student to fetch.
+        """
+        student = blocking_collection.find_one({"id": id})
+        if student:
+            student["_id"] = str(student["_id"])
+        return {"Data": student or {}, "Error": not student, "Message": ""}
+
+    agent = get_triage_agent()
+    settings = agent.model_settings
+    blocking_tools = [read_student_by_id if t.name == "read_student_by_id" else t for t in agent.tools]
+    return {
+        "parallel": agent,
+        "sequential": agent.clone(model_settings=settings.resolve(ModelSettings(parallel_tool_calls=False))),
+        "blocking": agent.clone(tools=blocking_tools),
+    }
+
+
+def open_collections(mongo_url, students: int):
+    docs = [{"id": i, "name": f"Student {i}", "email": f"s{i}@bench.local", "department": "CS"}
+            for i in range(1, students + 1)]
+    if mongo_url:
+        from pymongo import AsyncMongoClient, MongoClient
+
+        sync_collection = MongoClient(mongo_url)["tool_calls_bench"]["students"]
+        async_collection = AsyncMongoClient(mongo_url)["tool_calls_bench"]["students"]
+    else:
+        import mongomock
+
+        # mongomock is synchronous; DelayedCollection awaits its results as plain values
+        sync_collection = async_collection = mongomock.MongoClient()["tool_calls_bench"]["students"]
+    sync_collection.drop()
+    sync_collection.insert_many(docs)
+    sync_collection.create_index("id")
+    return {"sync": sync_collection, "async": async_collection}
+
+
+async def run(args) -> list:
+    from agents import Runner
+
+    collections = open_collections(args.mongo_url, max(args.lookups) + 10)
+    agents = build_agents(collections, args.db_latency_ms / 1000)
+    results = []
+    for lookups in args.lookups:
+        ids = list(range(1, lookups + 1))
+        prompt = "Show me student ids " + ", ".join(map(str, ids))
+        for name in CONFIGURATIONS:
+            samples = []
+            for _ in range(args.warmup + args.runs):
+                started = time.perf_counter()
+                await Runner.run(agents[name], [{"role": "user", "content": prompt}])
+                samples.append((time.perf_counter() - started) * 1000)
+            samples = samples[args.warmup:]
+            results.append({
+                "configuration": name,
+                "lookups": lookups,
+                "median_ms": round(statistics.median(samples), 1),
+                "min_ms": round(min(samples), 1),
+            })
+            print(f"{name:<11} lookups={lookups:<3} median={results[-1]['median_ms']:8.1f}ms "
+                  f"min={results[-1]['min_ms']:8.1f}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lookups", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--db-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--mongo-url", help="seed and read a real MongoDB instead of mongomock")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    # Read by config.llm_stub at import time
+    os.environ["LLM_PROVIDERS"] = "stub"
+    os.environ["STUB_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["STUB_LLM_TOKEN_DELAY_MS"] = "0"
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "tool_calls",
+                "db_latency_ms": args.db_latency_ms,
+                "llm_latency_ms": args.llm_latency_ms,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Throughput versus worker count for the production launcher (serve.py).
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 8 --concurrency 64 --duration 15
+
+For each worker count this starts ``serve.py`` on a free port, waits for
+/healthz, drives the target path with ``--concurrency`` keep-alive clients for
+``--duration`` seconds, then sends SIGTERM and waits for the graceful drain.
+Results (RPS, p50/p95/p99 latency, errors) are printed as a table and can be
+written as JSON with --output. See benchmarks/README.md for how to read them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def wait_until_healthy(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/healthz")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base_url} did not become healthy")
+
+
+async def drive(base_url: str, path: str, headers: dict, concurrency: int, duration: float):
+    latencies = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def user():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 400:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        started = time.monotonic()
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else None,
+    }
+
+
+def run_for_workers(workers: int, args) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    try:
+        asyncio.run(wait_until_healthy(base_url))
+        asyncio.run(drive(base_url, args.path, headers, args.concurrency, args.warmup))
+        result = asyncio.run(drive(base_url, args.path, headers, args.concurrency, args.duration))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        drain_started = time.monotonic()
+        server.wait(timeout=120)
+        drain_seconds = time.monotonic() - drain_started
+
+    return {"workers": workers, **result, "drain_s": drain_seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/healthz", help="endpoint to drive, e.g. /students/stats")
+    parser.add_argument("--token", help="Bearer token for authenticated paths")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run_for_workers(workers, args) for workers in args.workers]
+
+    print(f"{'workers':>7} {'rps':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['rps']:>10.1f} {r['p50_ms'] or 0:>8.1f} "
+              f"{r['p95_ms'] or 0:>8.1f} {r['p99_ms'] or 0:>8.1f} {r['errors']:>7}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump({
+                "benchmark": "worker_scaling",
+                "path": args.path,
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "cpu_count": os.cpu_count(),
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
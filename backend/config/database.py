@@ -1,27 +1,101 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 from dotenv import load_dotenv
+from utils.logger import get_logger
 import os
-load_dotenv()
-
+import threading
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+logger = get_logger(__name__)
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(DATABASE_URL)
+                logger.debug("Connected to MongoDB")
+    return _client
+
+
+def get_async_client():
+    """Return the process-wide AsyncMongoClient, for code running on the event loop."""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncMongoClient(DATABASE_URL)
+    return _async_client
+
+
+def get_async_db():
+    return get_async_client()["students_record"]
+
 
 def get_db():
     try:    
-        print("Connecting mongoDB")  
-        print("MONGODB_URI:", DATABASE_URL)  # Debugging line to check the URI
-
-        client = MongoClient(DATABASE_URL)
-        print("Connected to MongoDB",DATABASE_URL)
-        db=client["students_record"] # <-- specify your database name here
+        db=get_client()["students_record"] # <-- specify your database name here
         return db
 
     except Exception as e:
-        print("Error connecting to MongoDB:", e)
+        logger.error("Error connecting to MongoDB: %s", e)
         return None
-    
+
+
+def string_id_stages(as_field: str = "_id") -> list:
+    """Aggregation stages that return ``_id`` as a string (under ``as_field``).
+
+    The conversion runs in MongoDB, so results need no per-row Python pass.
+    """
+    if as_field == "_id":
+        return [{"$addFields": {"_id": {"$toString": "$_id"}}}]
+    return [{"$addFields": {as_field: {"$toString": "$_id"}}}, {"$project": {"_id": 0}}]
+
+
+def ping_db():
+    """Round-trip to the server; raises if MongoDB is unreachable."""
+    get_client().admin.command("ping")
+
+
+def ensure_indexes():
+    """Create the indexes the auth, tool, usage and background-job hot paths rely on (idempotent)."""
+    db = get_db()
+    db["signup"].create_index("email")
+    # Agent tools look students up by their numeric id
+    db["students"].create_index("id")
+    # Dashboards on a standalone server poll for students changed since their last check
+    db["students"].create_index("updated_at")
+    db["refresh_tokens"].create_index("token_hash", unique=True)
+    db["refresh_tokens"].create_index("user_id")
+    # TTL index: MongoDB removes refresh tokens once they expire
+    db["refresh_tokens"].create_index("expires_at", expireAfterSeconds=0)
+    # Usage counters are upserted by this key; budget checks read by user and day
+    db["usage"].create_index([("user_id", 1), ("day", 1), ("thread_id", 1), ("source", 1), ("model", 1)], unique=True)
+    # Background jobs are claimed by status and due time
+    db["jobs"].create_index([("status", 1), ("run_at", 1)])
+
+
+def close_db():
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def close_async_db():
+    global _async_client
+    client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
+
 
 # def get_db_client():
 #     try:
@@ -0,0 +1,95 @@
+import asyncio
+from typing import Dict
+
+from agents import Model, OpenAIChatCompletionsModel  # type: ignore
+
+from config.llm_providers import Provider, ProviderPool
+from utils.usage import usage_recorder
+
+
+class ResilientModel(Model):
+    """Agents-SDK model that routes every turn through a ``ProviderPool``.
+
+    Non-streamed turns are hedged and fail over as a whole. Streamed turns hedge
+    and fail over until the first event arrives; after that the stream is
+    committed to whichever provider produced it.
+    """
+
+    def __init__(self, pool: ProviderPool):
+        self.pool = pool
+        self._models: Dict[str, OpenAIChatCompletionsModel] = {}
+
+    def _model_for(self, provider: Provider) -> OpenAIChatCompletionsModel:
+        model = self._models.get(provider.name)
+        if model is None:
+            model = self._models[provider.name] = OpenAIChatCompletionsModel(
+                model=provider.model, openai_client=provider.client
+            )
+        return model
+
+    async def get_response(self, *args, **kwargs):
+        def record_usage(provider: Provider, response):
+            if response.usage:
+                usage_recorder.record("agent", provider.model, response.usage.input_tokens,
+                                      response.usage.output_tokens)
+
+        # Unused hedge responses were still paid for
+        provider, response = await self.pool.run(
+            lambda provider: self._model_for(provider).get_response(*args, **kwargs),
+            discard=record_usage,
+        )
+        record_usage(provider, response)
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        # Each candidate stream is drained by its own task: the SDK's generation
+        # span is a context variable, so the generator must start and finish in
+        # the same context rather than move from the hedging task to the caller.
+        async def open_stream(provider: Provider):
+            queue: asyncio.Queue = asyncio.Queue()
+            started = asyncio.get_running_loop().create_future()
+
+            async def pump():
+                try:
+                    async for event in self._model_for(provider).stream_response(*args, **kwargs):
+                        if not started.done():
+                            started.set_result(None)
+                        queue.put_nowait(("event", event))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if not started.done():
+                        started.set_exception(e)
+                        return
+                    queue.put_nowait(("error", e))
+                finally:
+                    if not started.done():
+                        started.set_result(None)
+                    queue.put_nowait(("end", None))
+
+            task = asyncio.create_task(pump())
+            try:
+                await started
+            except BaseException:
+                task.cancel()
+                raise
+            return queue, task
+
+        def close_stream(provider: Provider, opened):
+            # A losing stream must not keep draining into a queue nobody reads
+            opened[1].cancel()
+
+        provider, (queue, task) = await self.pool.run(open_stream, mode="stream", discard=close_stream)
+        try:
+            while True:
+                kind, item = await queue.get()
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise item
+                if getattr(item, "type", None) == "response.completed" and item.response.usage:
+                    usage = item.response.usage
+                    usage_recorder.record("agent", provider.model, usage.input_tokens, usage.output_tokens)
+                yield item
+        finally:
+            task.cancel()
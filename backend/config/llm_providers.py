@@ -0,0 +1,383 @@
+"""Pluggable LLM providers with shared connection pools, hedging and failover.
+
+Providers are configured as an ordered, comma-separated list of
+``name[:model]`` entries, primary first:
+
+    LLM_PROVIDERS=gemini,groq:llama-3.3-70b-versatile   # the chat agent
+    RAG_LLM_PROVIDERS=groq,gemini                       # rag_query answers
+    LLM_PROVIDERS=stub RAG_LLM_PROVIDERS=stub           # offline load testing
+
+Providers whose API key is not set are skipped. Every provider speaks the
+OpenAI chat-completions protocol, so one ``AsyncOpenAI`` client per provider
+(over a shared, tuned httpx pool) covers them all.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from utils.logger import get_logger
+from utils.metrics import Counter, Histogram
+from utils.usage import usage_recorder
+load_dotenv()
+
+logger = get_logger(__name__)
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+# Hedging: fire the next provider once the primary is slower than its recent p95
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "3"))
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+# Circuit breaker: consecutive failures before a provider is skipped, and for how long
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+PROVIDER_DEFAULTS = {
+    "gemini": {
+        "base_url": "https://generativelanguage.googleapis.com/v1beta/openai/",
+        "api_key_env": "GEMINI_API_KEY",
+        "model": "gemini-2.5-flash",
+    },
+    "groq": {
+        "base_url": "https://api.groq.com/openai/v1",
+        "api_key_env": "GROQ_API_KEY",
+        "model": "llama-3.3-70b-versatile",
+    },
+    "openai": {
+        "base_url": "https://api.openai.com/v1",
+        "api_key_env": "OPENAI_API_KEY",
+        "model": "gpt-4o-mini",
+    },
+    "stub": {
+        "base_url": "http://llm-stub.local/v1",
+        "api_key_env": None,
+        "model": "stub-model",
+    },
+}
+
+llm_requests = Counter(
+    "llm_requests_total", "LLM calls by provider and outcome", ("provider", "outcome"),
+)
+llm_latency = Histogram(
+    "llm_request_duration_seconds",
+    "LLM latency by provider (full response, or time to first event when streaming)",
+    ("provider", "mode"),
+)
+llm_hedges = Counter("llm_hedged_requests_total", "Backup LLM calls fired by hedging", ("pool",))
+
+
+class CircuitBreaker:
+    """Opens after N consecutive failures; lets one trial call through after the cooldown."""
+
+    def __init__(self, failure_threshold: int, cooldown_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # When the half-open trial call started; a trial that never reports back
+        # expires after another cooldown
+        self.trial_started_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half_open"
+        return "open"
+
+    def _trial_in_flight(self) -> bool:
+        return (self.trial_started_at is not None
+                and time.monotonic() - self.trial_started_at < self.cooldown_seconds)
+
+    def available(self) -> bool:
+        """Whether a call could start now, without claiming the half-open trial."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight())
+
+    def allow(self) -> bool:
+        """Whether a call may start now; claims the trial slot when half-open."""
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self.trial_started_at = time.monotonic()
+        return True
+
+    def release_trial(self):
+        """The trial call ended without a verdict (e.g. it was cancelled)."""
+        self.trial_started_at = None
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.state == "half_open":
+            self.opened_at = time.monotonic()
+        self.trial_started_at = None
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+@dataclass
+class Provider:
+    name: str
+    model: str
+    base_url: str
+    api_key: str
+    client: object  # AsyncOpenAI
+    breaker: CircuitBreaker
+    latency: LatencyTracker
+    stream_latency: LatencyTracker
+
+
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_pools: Dict[str, "ProviderPool"] = {}
+_lock = threading.Lock()
+
+
+def get_http_client(provider_name: str) -> httpx.AsyncClient:
+    """One keep-alive connection pool per provider, shared by every caller in the process."""
+    client = _http_clients.get(provider_name)
+    if client is None:
+        kwargs = {}
+        if provider_name == "stub":
+            from config.llm_stub import StubLLMTransport
+            kwargs["transport"] = StubLLMTransport()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30,
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=5.0),
+            **kwargs,
+        )
+        _http_clients[provider_name] = client
+    return client
+
+
+def _build_provider(spec: str) -> Optional[Provider]:
+    name, _, model = spec.strip().partition(":")
+    defaults = PROVIDER_DEFAULTS.get(name)
+    if defaults is None:
+        logger.error("Unknown LLM provider %r, skipping", name)
+        return None
+
+    api_key = os.getenv(defaults["api_key_env"]) if defaults["api_key_env"] else "stub"
+    if not api_key:
+        logger.warning("LLM provider %s skipped: %s is not set", name, defaults["api_key_env"])
+        return None
+
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=defaults["base_url"],
+        http_client=get_http_client(name),
+        max_retries=LLM_MAX_RETRIES,
+    )
+    return Provider(
+        name=name,
+        model=model or defaults["model"],
+        base_url=defaults["base_url"],
+        api_key=api_key,
+        client=client,
+        breaker=CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN_SECONDS),
+        latency=LatencyTracker(),
+        stream_latency=LatencyTracker(),
+    )
+
+
+class ProviderPool:
+    """An ordered set of interchangeable providers with hedging and failover."""
+
+    def __init__(self, name: str, providers: List[Provider]):
+        self.name = name
+        self.providers = providers
+
+    def candidates(self) -> List[Provider]:
+        """Providers in priority order, skipping open circuits (unless all are open)."""
+        available = [p for p in self.providers if p.breaker.available()]
+        return available or list(self.providers)
+
+    def hedge_delay(self, provider: Provider, streaming: bool = False) -> float:
+        tracker = provider.stream_latency if streaming else provider.latency
+        p95 = tracker.p95()
+        if p95 is None:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(LLM_HEDGE_MIN_DELAY_SECONDS, p95)
+
+    def _record(self, provider: Provider, mode: str, started: float, error: Optional[BaseException]):
+        if isinstance(error, asyncio.CancelledError):
+            provider.breaker.release_trial()
+            llm_requests.inc(provider=provider.name, outcome="cancelled")
+            return
+        if error is not None:
+            provider.breaker.record_failure()
+            llm_requests.inc(provider=provider.name, outcome="error")
+            logger.warning("LLM provider %s failed: %s", provider.name, error)
+            return
+        elapsed = time.monotonic() - started
+        provider.breaker.record_success()
+        (provider.stream_latency if mode == "stream" else provider.latency).observe(elapsed)
+        llm_latency.observe(elapsed, provider=provider.name, mode=mode)
+        llm_requests.inc(provider=provider.name, outcome="ok")
+
+    async def run(self, call: Callable[[Provider], Awaitable], mode: str = "response",
+                  discard: Optional[Callable[[Provider, object], None]] = None):
+        """Run ``call`` against the primary provider, hedging to and failing over to the
+        next ones. Returns ``(provider, result)`` of the first call that succeeds.
+
+        Other calls that also succeed (a hedge finishing at the same moment, or
+        before its cancellation lands) are passed to ``discard`` so their
+        resources can be closed and their usage recorded.
+        """
+        candidates = self.candidates()
+        if not candidates:
+            raise RuntimeError(f"No LLM providers configured for {self.name}")
+
+        async def attempt(provider: Provider):
+            started = time.monotonic()
+            try:
+                result = await call(provider)
+            except BaseException as e:
+                self._record(provider, mode, started, e)
+                raise
+            self._record(provider, mode, started, None)
+            return provider, result
+
+        def dispose(task: asyncio.Future):
+            if task.cancelled() or task.exception() is not None or discard is None:
+                return
+            try:
+                discard(*task.result())
+            except Exception as e:
+                logger.warning("Discarding an unused %s result failed: %s", self.name, e)
+
+        pending = set()
+        unused = []
+        remaining = list(candidates)
+        last_error: Optional[BaseException] = None
+        try:
+            while remaining or pending:
+                if remaining and (not pending or LLM_HEDGING):
+                    provider = remaining.pop(0)
+                    if not provider.breaker.allow() and (remaining or pending):
+                        # Half-open and its one trial call is already running elsewhere
+                        continue
+                    if pending:
+                        llm_hedges.inc(pool=self.name)
+                    pending.add(asyncio.ensure_future(attempt(provider)))
+                    timeout = self.hedge_delay(provider, mode == "stream") if remaining and LLM_HEDGING else None
+                else:
+                    timeout = None
+
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        unused.append(task)
+                if winner is not None:
+                    return winner.result()
+                # Nothing succeeded yet: the loop starts the next provider (failover or hedge)
+        finally:
+            for task in unused:
+                dispose(task)
+            for task in pending:
+                # A task that completes before the cancellation lands is disposed of too
+                task.add_done_callback(dispose)
+                task.cancel()
+
+        raise last_error or RuntimeError(f"All LLM providers failed for {self.name}")
+
+    async def complete(self, prompt: str, temperature: float = 0.7, max_tokens: int = 1024,
+                       source: str = "completion"):
+        """One-shot chat completion. Returns ``(text, usage)``; usage is also recorded under ``source``."""
+        async def call(provider: Provider):
+            return await provider.client.chat.completions.create(
+                model=provider.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+
+        def record_usage(provider: Provider, response):
+            if response.usage:
+                usage_recorder.record(source, provider.model, response.usage.prompt_tokens,
+                                      response.usage.completion_tokens)
+
+        # Unused hedge responses were still paid for
+        provider, response = await self.run(call, discard=record_usage)
+        record_usage(provider, response)
+        text = response.choices[0].message.content if response.choices else ""
+        return text or "", response.usage
+
+    def as_agent_model(self):
+        from config.llm_agent_model import ResilientModel
+
+        return ResilientModel(self)
+
+    def status(self) -> dict:
+        return {p.name: {"model": p.model, "circuit": p.breaker.state} for p in self.providers}
+
+
+def get_provider_pool(name: str, env_var: str, default: str) -> ProviderPool:
+    """Build (once) the pool described by ``env_var``."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(name)
+            if pool is None:
+                specs = [s for s in os.getenv(env_var, default).split(",") if s.strip()]
+                providers = [p for p in (_build_provider(s) for s in specs) if p is not None]
+                pool = _pools[name] = ProviderPool(name, providers)
+    return pool
+
+
+def get_agent_pool() -> ProviderPool:
+    return get_provider_pool("agent", "LLM_PROVIDERS", "gemini")
+
+
+def get_rag_pool() -> ProviderPool:
+    return get_provider_pool("rag", "RAG_LLM_PROVIDERS", "groq")
+
+
+def get_title_pool() -> ProviderPool:
+    """Thread titling; defaults to the RAG providers."""
+    return get_provider_pool("title", "TITLE_LLM_PROVIDERS", os.getenv("RAG_LLM_PROVIDERS", "groq"))
+
+
+async def close_http_clients():
+    for client in list(_http_clients.values()):
+        await client.aclose()
+    _http_clients.clear()
+    _pools.clear()
@@ -0,0 +1,153 @@
+"""Deterministic, offline stand-in for an OpenAI-compatible chat-completions API.
+
+Plugged in as the httpx transport of a normal ``AsyncOpenAI`` client, so the
+whole pipeline (agents SDK, streaming handler, SSE route) runs unchanged while
+no request leaves the process. Latency is configurable to make load tests
+realistic:
+
+    STUB_LLM_LATENCY_MS      delay before the first byte (time to first token)
+    STUB_LLM_TOKEN_DELAY_MS  delay between streamed tokens
+
+A user message naming "student ids 3, 7 and 12" makes the stub call the
+``read_student_by_id`` tool for each id before answering: all in one response,
+or one per response when the request sets ``parallel_tool_calls`` to false.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+
+import httpx
+
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "50"))
+STUB_LLM_TOKEN_DELAY_MS = float(os.getenv("STUB_LLM_TOKEN_DELAY_MS", "5"))
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def stub_answer(body: dict) -> str:
+    """The reply depends only on the request, so runs are reproducible."""
+    messages = body.get("messages") or []
+    last_user = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+    words = last_user.split()
+    echo = " ".join(words[:24]) + (" ..." if len(words) > 24 else "")
+    return f"This is a stub answer from {body.get('model', 'stub')} to: {echo}"
+
+
+STUDENT_IDS_RE = re.compile(r"student ids?\s+(\d+(?:(?:\s*,\s*|\s+and\s+)\d+)*)", re.IGNORECASE)
+
+
+def stub_tool_calls(body: dict) -> list:
+    """``read_student_by_id`` calls still owed for the ids in the last user message."""
+    tools = {(t.get("function") or {}).get("name") for t in body.get("tools") or []}
+    messages = body.get("messages") or []
+    last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=None)
+    if "read_student_by_id" not in tools or last_user is None:
+        return []
+    match = STUDENT_IDS_RE.search(_message_text(messages[last_user]))
+    if not match:
+        return []
+
+    called = set()
+    for message in messages[last_user + 1:]:
+        for call in message.get("tool_calls") or []:
+            called.add(json.loads(call["function"]["arguments"] or "{}").get("id"))
+    pending = [int(i) for i in re.findall(r"\d+", match.group(1)) if int(i) not in called]
+    if body.get("parallel_tool_calls") is False:
+        pending = pending[:1]
+    return [
+        {"id": f"call_stub_{i}", "type": "function",
+         "function": {"name": "read_student_by_id", "arguments": json.dumps({"id": i})}}
+        for i in pending
+    ]
+
+
+def _usage(body: dict, answer: str) -> dict:
+    prompt_tokens = sum(len(_message_text(m).split()) for m in body.get("messages") or [])
+    completion_tokens = len(answer.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _StubStream(httpx.AsyncByteStream):
+    def __init__(self, body: dict, answer: str, tool_calls: list):
+        self.body = body
+        self.answer = answer
+        self.tool_calls = tool_calls
+
+    async def __aiter__(self):
+        created = int(time.time())
+        base = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                "model": self.body.get("model", "stub")}
+
+        await asyncio.sleep(STUB_LLM_LATENCY_MS / 1000)
+        if self.tool_calls:
+            calls = [{"index": i, **call} for i, call in enumerate(self.tool_calls)]
+            chunk = {**base, "choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": calls},
+                                          "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            done = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}]}
+            yield f"data: {json.dumps(done)}\n\n".encode()
+            usage = {**base, "choices": [], "usage": _usage(self.body, "")}
+            yield f"data: {json.dumps(usage)}\n\n".encode()
+            yield b"data: [DONE]\n\n"
+            return
+
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == len(words) - 1 else word + " "}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            if STUB_LLM_TOKEN_DELAY_MS:
+                await asyncio.sleep(STUB_LLM_TOKEN_DELAY_MS / 1000)
+
+        done = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(done)}\n\n".encode()
+        usage = {**base, "choices": [], "usage": _usage(self.body, self.answer)}
+        yield f"data: {json.dumps(usage)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+
+class StubLLMTransport(httpx.AsyncBaseTransport):
+    """Answers ``POST .../chat/completions`` (streaming or not) without network access."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not request.url.path.endswith("/chat/completions"):
+            return httpx.Response(404, json={"error": {"message": f"stub has no {request.url.path}"}})
+
+        body = json.loads(await request.aread() or b"{}")
+        tool_calls = stub_tool_calls(body)
+        answer = "" if tool_calls else stub_answer(body)
+
+        if body.get("stream"):
+            return httpx.Response(
+                200, headers={"content-type": "text/event-stream"}, stream=_StubStream(body, answer, tool_calls)
+            )
+
+        await asyncio.sleep(STUB_LLM_LATENCY_MS / 1000)
+        message = {"role": "assistant", "content": answer or None}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        return httpx.Response(200, json={
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": _usage(body, answer),
+        })
@@ -1,12 +1,63 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from routes.chat_routs import chat
 from routes.auth_routes import auth
 from routes.students_routes import students_router
-from config.database import get_db
+from routes.metrics_routes import metrics_router
+from routes.health_routes import health_router
+from routes.analytic_routs import analytics_router
+from utils.metrics import MetricsMiddleware
+from utils.compression import CompressionMiddleware
+from utils.json_response import FastJSONResponse
+from utils.logger import RequestIdMiddleware, get_logger, setup_logging
+from config.database import close_async_db, close_db, ensure_indexes
+from config.llm_providers import close_http_clients
+from tools.general_info import get_split_docs
+from utils.auth_utils import get_bcrypt_rounds, shutdown_hash_pool
+from utils.usage import usage_recorder
+from utils.task_queue import task_queue
+from utils.student_events import student_events
+import asyncio
 load_dotenv()
 
+logger = get_logger(__name__)
+
+
+async def warm_up():
+    """Load heavy resources in the background so the server accepts requests immediately."""
+    steps = [
+        # Starts the bcrypt pool and runs cost calibration before the first login;
+        # first, because loading a large knowledge base can take minutes
+        ("bcrypt pool", get_bcrypt_rounds),
+        ("database indexes", lambda: asyncio.to_thread(ensure_indexes)),
+        ("knowledge base", lambda: asyncio.to_thread(get_split_docs)),
+    ]
+    for name, step in steps:
+        try:
+            await step()
+            logger.info("Warm-up: %s ready", name)
+        except Exception as e:
+            logger.exception("Warm-up of %s failed: %s", name, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    warm_up_task = asyncio.create_task(warm_up())
+    await task_queue.start()
+    await usage_recorder.start()
+    yield
+    warm_up_task.cancel()
+    shutdown_hash_pool()
+    # Queued jobs may still need the LLM clients and the database
+    await task_queue.stop()
+    await student_events.close()
+    await close_http_clients()
+    await usage_recorder.close()
+    await close_async_db()
+    close_db()
 
 
 app = FastAPI(
@@ -14,7 +65,9 @@ app = FastAPI(
     description="API for managing user logins and agent information",
     version="1.0.0",
     docs_url="/docs",          
-    redoc_url="/redoc"         
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -24,11 +77,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestIdMiddleware)
 
 
 app.include_router(chat, prefix="/chat", tags=["chat"])
 app.include_router(auth, prefix="/auth", tags=["auth"])
 app.include_router(students_router, prefix="", tags=["students"])
+app.include_router(metrics_router, prefix="", tags=["metrics"])
+app.include_router(health_router, prefix="", tags=["health"])
+app.include_router(analytics_router, prefix="", tags=["usage"])
 
 
 
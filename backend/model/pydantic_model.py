@@ -33,3 +33,6 @@ class ResetPasswordRequest(BaseModel):
     
     
 
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
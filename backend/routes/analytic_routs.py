@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, Query
+from datetime import datetime, timedelta, timezone
+from utils.auth_utils import get_current_user
+from utils.json_response import FastJSONResponse
+from utils.metrics import span
+from utils.usage import (
+    USAGE_DAILY_COST_BUDGET_USD,
+    USAGE_DAILY_TOKEN_BUDGET,
+    get_usage_collection,
+    usage_recorder,
+)
+import asyncio
+
+analytics_router = APIRouter()
+
+USAGE_TOTALS = {
+    "prompt_tokens": {"$sum": "$prompt_tokens"},
+    "completion_tokens": {"$sum": "$completion_tokens"},
+    "total_tokens": {"$sum": "$total_tokens"},
+    "requests": {"$sum": "$requests"},
+    "cost_usd": {"$sum": "$cost_usd"},
+}
+
+
+def usage_breakdown(user_id: str, since_day: str, top_threads: int) -> dict:
+    """Totals, per day, per source/model and the most expensive threads, in one round trip"""
+    def group_by(key):
+        return [{"$group": {"_id": key, **USAGE_TOTALS}}]
+
+    pipeline = [
+        {"$match": {"user_id": user_id, "day": {"$gte": since_day}}},
+        {"$facet": {
+            "totals": group_by(None),
+            "by_day": group_by("$day") + [{"$sort": {"_id": 1}}],
+            "by_source": group_by({"source": "$source", "model": "$model"}) + [{"$sort": {"total_tokens": -1}}],
+            "top_threads": group_by("$thread_id") + [{"$sort": {"total_tokens": -1}}, {"$limit": top_threads}],
+        }},
+    ]
+    with span("db.usage.aggregate"):
+        facets = list(get_usage_collection().aggregate(pipeline))[0]
+
+    def rows(name, key_field):
+        return [{key_field: row.pop("_id"), **row} for row in facets[name]]
+
+    totals = facets["totals"][0] if facets["totals"] else {name: 0 for name in USAGE_TOTALS}
+    totals.pop("_id", None)
+    by_source = [{**row.pop("_id"), **row} for row in facets["by_source"]]
+    return {
+        "totals": totals,
+        "by_day": rows("by_day", "day"),
+        "by_source": by_source,
+        "top_threads": rows("top_threads", "thread_id"),
+    }
+
+
+@analytics_router.get("/usage")
+async def get_usage(
+    days: int = Query(7, ge=1, le=90),
+    top_threads: int = Query(10, ge=1, le=100),
+    current_user: dict = Depends(get_current_user),
+):
+    """Token usage and estimated cost for the current user, with today's budget"""
+    user_id = str(current_user["user_id"])
+    # Unflushed usage is written first so the numbers include the latest turns
+    await usage_recorder.flush()
+
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    breakdown = await asyncio.to_thread(usage_breakdown, user_id, since_day, top_threads)
+    tokens_today, cost_today = await usage_recorder.daily_totals(user_id)
+
+    return FastJSONResponse({
+        "user_id": user_id,
+        "since": since_day,
+        **breakdown,
+        "budget": {
+            "daily_token_budget": USAGE_DAILY_TOKEN_BUDGET or None,
+            "daily_cost_budget_usd": USAGE_DAILY_COST_BUDGET_USD or None,
+            "tokens_today": tokens_today,
+            "cost_today_usd": round(cost_today, 6),
+            "tokens_remaining": max(0, USAGE_DAILY_TOKEN_BUDGET - tokens_today) if USAGE_DAILY_TOKEN_BUDGET else None,
+        },
+    })
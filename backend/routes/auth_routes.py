@@ -1,114 +1,131 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pymongo.collection import Collection
 from config.database import get_db   # <-- should return MongoDB database
-from utils.auth_utils import create_access_token, hash_password, verify_api_key, verify_password,verify_access_token
-from model.pydantic_model import LoginUser, UserCreate,ResetPasswordRequest
+from utils.auth_utils import (
+    PasswordHasherBusy,
+    consume_refresh_token,
+    create_access_token,
+    create_refresh_token,
+    hash_password_async,
+    verify_api_key,
+    verify_password_async,
+    verify_access_token,
+)
+from model.pydantic_model import LoginUser, UserCreate,ResetPasswordRequest,RefreshTokenRequest
 from bson import ObjectId
+import asyncio
 
 auth = APIRouter()
 
+# Hashing runs in a separate process pool; these handlers are async so a login
+# burst waits on that pool without tying up the shared threadpool. Blocking
+# Mongo calls are pushed to threads individually.
+
+def hasher_busy_error(e: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+async def issue_tokens(db, db_user) -> dict:
+    token = create_access_token(
+        data={"email": db_user["email"], "name": db_user["name"], "user_id": str(db_user["_id"])}
+    )
+    refresh_token = await asyncio.to_thread(create_refresh_token, db["refresh_tokens"], str(db_user["_id"]))
+    return {"token": token, "refresh_token": refresh_token}
+
+
 @auth.post("/register")
-def create_user(user: UserCreate, db=Depends(get_db)):
+async def create_user(user: UserCreate, db=Depends(get_db)):
     try:
         users_collection: Collection = db["signup"]   # <-- changed to signup
 
-        if users_collection.find_one({"email": user.email}):
+        if await asyncio.to_thread(users_collection.find_one, {"email": user.email}):
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        user_hash_password = hash_password(user.password)
+        user_hash_password = await hash_password_async(user.password)
         user_doc = {
             "name": user.name,
             "email": user.email,
             "password": user_hash_password,
         }
-        result = users_collection.insert_one(user_doc)
-        db_user = users_collection.find_one({"_id": result.inserted_id})
+        result = await asyncio.to_thread(users_collection.insert_one, user_doc)
+        db_user = await asyncio.to_thread(users_collection.find_one, {"_id": result.inserted_id})
 
-        token = create_access_token(
-            data={"email": db_user["email"], "name": db_user["name"], "user_id": str(db_user["_id"])}
-        )
+        tokens = await issue_tokens(db, db_user)
 
-        return {"data": {"name": db_user["name"], "email": db_user["email"], "token": token},
+        return {"data": {"name": db_user["name"], "email": db_user["email"], **tokens},
                 "message": "User registered and login successfully",
                 "status": "success"}
+    except PasswordHasherBusy as e:
+        raise hasher_busy_error(e)
     except Exception as e:
         return {"message": str(e), "status": "error", "data": None}
 
 
 @auth.post("/login", dependencies=[Depends(verify_api_key)])
-def login_user(user: LoginUser, db=Depends(get_db)):
+async def login_user(user: LoginUser, db=Depends(get_db)):
     try:
-        users_collection: Collection = db["signup"]   
+        users_collection: Collection = db["signup"]
 
-        db_user = users_collection.find_one({"email": user.email})
+        db_user = await asyncio.to_thread(users_collection.find_one, {"email": user.email})
         if not db_user:
             raise HTTPException(status_code=404, detail="Email not found")
 
-        is_valid_password = verify_password(user.password, db_user["password"])
+        is_valid_password, new_hash = await verify_password_async(user.password, db_user["password"])
         if not is_valid_password:
             raise HTTPException(status_code=401, detail="Invalid password")
 
-        token = create_access_token(
-            data={"email": db_user["email"], "name": db_user["name"], "user_id": str(db_user["_id"])}
-        )
+        if new_hash:
+            # Cost factor changed since this hash was stored: upgrade it transparently
+            await asyncio.to_thread(
+                users_collection.update_one, {"_id": db_user["_id"]}, {"$set": {"password": new_hash}}
+            )
+
+        tokens = await issue_tokens(db, db_user)
 
-        return {"data": {"name": db_user["name"], "email": db_user["email"], "token": token},
+        return {"data": {"name": db_user["name"], "email": db_user["email"], **tokens},
                 "message": "User logged in successfully",
                 "status": "success"}
+    except PasswordHasherBusy as e:
+        raise hasher_busy_error(e)
     except Exception as e:
         return {"message": str(e), "status": "error", "data": None}
 
 
+@auth.post("/refresh")
+async def refresh_access_token(request: RefreshTokenRequest, db=Depends(get_db)):
+    """Trade a refresh token for a new access token (and a rotated refresh token) without bcrypt"""
+    record = await asyncio.to_thread(consume_refresh_token, db["refresh_tokens"], request.refresh_token)
+    if record is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
+    db_user = await asyncio.to_thread(db["signup"].find_one, {"_id": ObjectId(record["user_id"])})
+    if not db_user:
+        raise HTTPException(status_code=401, detail="User no longer exists")
 
-@auth.post("/reset-password")
-def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
-    users_collection: Collection = db["signup"]
-
-    # normalize email to lowercase & strip spaces
-    email = request.email.strip().lower()
-
-    user = users_collection.find_one({"email": email})
-    if not user:
-        # 👀 debug print to see what’s really inside DB
-        all_users = list(users_collection.find({}, {"email": 1}))
-        raise HTTPException(
-            status_code=404,
-            detail=f"Email not found. Provided={email}, Existing={all_users}"
-        )
-
-    hashed_pw = hash_password(request.new_password)
-    result = users_collection.update_one(
-        {"_id": ObjectId(user["_id"])},
-        {"$set": {"password": hashed_pw}}
-    )
-
-    if result.modified_count == 0:
-        raise HTTPException(status_code=400, detail="Password update failed")
+    tokens = await issue_tokens(db, db_user)
+    return {"data": {"name": db_user["name"], "email": db_user["email"], **tokens},
+            "message": "Token refreshed successfully",
+            "status": "success"}
 
-    return {
-        "message": f"Password has been reset for {email}",
-        "status": "success"
-    }
 
 @auth.post("/reset-password")
-def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
+async def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
     users_collection: Collection = db["signup"]
 
     # normalize email to lowercase & strip spaces
     email = request.email.strip().lower()
 
-    user = users_collection.find_one({"email": email})
+    user = await asyncio.to_thread(users_collection.find_one, {"email": email})
     if not user:
-        # 👀 debug print to see what’s really inside DB
-        all_users = list(users_collection.find({}, {"email": 1}))
-        raise HTTPException(
-            status_code=404,
-            detail=f"Email not found. Provided={email}, Existing={all_users}"
-        )
-
-    hashed_pw = hash_password(request.new_password)
-    result = users_collection.update_one(
+        raise HTTPException(status_code=404, detail="Email not found")
+
+    try:
+        hashed_pw = await hash_password_async(request.new_password)
+    except PasswordHasherBusy as e:
+        raise hasher_busy_error(e)
+
+    result = await asyncio.to_thread(
+        users_collection.update_one,
         {"_id": ObjectId(user["_id"])},
         {"$set": {"password": hashed_pw}}
     )
@@ -116,6 +133,9 @@ def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Password update failed")
 
+    # Sessions started with the old password must log in again
+    await asyncio.to_thread(db["refresh_tokens"].delete_many, {"user_id": str(user["_id"])})
+
     return {
         "message": f"Password has been reset for {email}",
         "status": "success"
@@ -1,146 +1,226 @@
 from fastapi import APIRouter, HTTPException, Body, Depends
-from fastapi.responses import StreamingResponse
 from typing import Dict, Optional
 from pydantic import BaseModel
 from datetime import datetime
 from dotenv import load_dotenv
 from bson import ObjectId
-from config.database import get_db
-from student_agent.agent_help import triage_agent
+from config.database import get_db, string_id_stages
+from config.llm_providers import get_title_pool
+from student_agent.agent_help import get_triage_agent
 from agents import Runner
 from utils.auth_utils import get_current_user
-import json
+from utils.admission import agent_admission
+from utils.streaming import GuardedStreamingResponse
+from utils.usage import usage_recorder, usage_scope
+from utils.task_queue import task_queue
+from utils.metrics import span, record_span, llm_ttft, sse_bytes_sent
+from utils.logger import get_logger
+from utils.json_response import FastJSONResponse, json_dumps
 import asyncio
+import time
 
 load_dotenv()
 
-db = get_db()
-chats_collection = db["chats"]
-threads_collection = db["threads"]
+def get_chats_collection():
+    return get_db()["chats"]
+
+def get_threads_collection():
+    return get_db()["threads"]
 
 chat = APIRouter()
+logger = get_logger(__name__)
 
 class ChatRequest(BaseModel):
     user_input: str
     thread_id: Optional[str] = None  # Optional thread_id for continuing existing conversations
     stream: Optional[bool] = False  # Whether to stream the response
 
-def save_message(user_id: str, thread_id: str, role: str, content: str):
+TITLE_PROMPT = (
+    "Write a short title (at most 6 words) for a conversation that starts with the exchange below. "
+    "Reply with the title only, without quotes.\n\nUser: {user_text}\n\nAssistant: {assistant_reply}"
+)
+# Characters of each message sent to the title model
+TITLE_CONTEXT_CHARS = 1000
+
+def truncated_title(user_text: str) -> str:
+    return user_text[:50] + "..." if len(user_text) > 50 else user_text
+
+def save_message(user_id: str, thread_id: str, role: str, content: str,
+                 timestamp: Optional[datetime] = None):
     chat_doc = {
         "user_id": user_id,
         "thread_id": thread_id,
         "role": role,
         "content": content,
-        "timestamp": datetime.utcnow()
+        "timestamp": timestamp or datetime.utcnow()
     }
-    result = chats_collection.insert_one(chat_doc)
+    with span("db.chats.insert"):
+        result = get_chats_collection().insert_one(chat_doc)
     return str(result.inserted_id)
 
-def create_new_thread(user_id: str) -> str:
+def create_new_thread(user_id: str, title: str = "New Conversation") -> str:
     """
     🔑 Create a brand new thread for each chat session.
     """
-    result = threads_collection.insert_one({
-        "user_id": user_id,
-        "title": "New Conversation",
-        "created_at": datetime.utcnow()
-    })
+    with span("db.threads.insert"):
+        result = get_threads_collection().insert_one({
+            "user_id": user_id,
+            "title": title,
+            "created_at": datetime.utcnow()
+        })
     return str(result.inserted_id)
 
+@task_queue.task("update_thread_stats")
+def update_thread_stats_job(thread_id: str):
+    """Refresh the thread's message count and last activity"""
+    with span("db.threads.stats"):
+        count = get_chats_collection().count_documents({"thread_id": thread_id})
+        get_threads_collection().update_one(
+            {"_id": ObjectId(thread_id)},
+            {"$set": {"message_count": count, "updated_at": datetime.utcnow()}}
+        )
+
+@task_queue.task("generate_thread_title")
+async def generate_thread_title_job(user_id: str, thread_id: str, user_text: str, assistant_reply: str):
+    """Replace the truncated first-message title with one written by the title model"""
+    pool = get_title_pool()
+    if not pool.providers:
+        return  # No title model configured: the truncated title stays
+    prompt = TITLE_PROMPT.format(
+        user_text=user_text[:TITLE_CONTEXT_CHARS], assistant_reply=assistant_reply[:TITLE_CONTEXT_CHARS]
+    )
+    with usage_scope(user_id, thread_id):
+        text, _ = await pool.complete(prompt, temperature=0.3, max_tokens=24, source="thread_title")
+    title = " ".join(text.split()).strip("\"'*#. ")
+    if title:
+        await asyncio.to_thread(
+            get_threads_collection().update_one, {"_id": ObjectId(thread_id)}, {"$set": {"title": title[:80]}}
+        )
+
+def save_reply(user_id: str, thread_id: str, user_text: str, assistant_reply: str,
+               new_thread: bool) -> dict:
+    """Store the assistant message and queue the work that can wait; returns the stored message.
+
+    The message itself is written before the response ends: the next turn
+    reads its context from the chats collection and must find it there.
+    """
+    timestamp = datetime.utcnow()
+    message_id = save_message(user_id, thread_id, "assistant", assistant_reply, timestamp)
+    task_queue.enqueue("update_thread_stats", thread_id=thread_id)
+    if new_thread:
+        task_queue.enqueue(
+            "generate_thread_title", user_id=user_id, thread_id=thread_id,
+            user_text=user_text, assistant_reply=assistant_reply,
+        )
+    return {
+        "id": message_id,
+        "thread_id": thread_id,
+        "role": "assistant",
+        "content": assistant_reply,
+        "timestamp": timestamp,
+    }
+
+def sse_event(payload: dict) -> bytes:
+    """Encode one server-sent event frame and count it towards the SSE byte metrics"""
+    frame = b"data: " + json_dumps(payload) + b"\n\n"
+    sse_bytes_sent.inc(len(frame), route="/chat/stream")
+    return frame
+
 @chat.post("/stream")
 async def chat_stream_endpoint(
     request: ChatRequest = Body(...),
     current_user: dict = Depends(get_current_user)
 ):
     """Streaming chat endpoint"""
+    user_id = str(current_user["user_id"])
+    await usage_recorder.check_budget(user_id)
+    # Released by the response once it has been streamed, or has failed to start
+    await agent_admission.acquire(user_id)
     try:
-        print(f"Received streaming request: {request}")
-        print(f"Request user_input: {request.user_input}")
-        print(f"Request thread_id: {request.thread_id}")
+        logger.info("Streaming chat request thread_id=%s", request.thread_id)
         
-        user_id = str(current_user["user_id"])
         user_text = request.user_input.strip()
         if not user_text:
             raise HTTPException(status_code=400, detail="User input cannot be empty.")
 
         # ✅ Create new thread for each chat session or use provided thread_id
-        if request.thread_id and not request.thread_id.startswith("temp-"):
+        new_thread = not request.thread_id or request.thread_id.startswith("temp-")
+        if not new_thread:
             # Use existing thread if provided and not a temporary ID
             thread_id = request.thread_id
             # Verify thread belongs to user
-            thread = threads_collection.find_one({"_id": ObjectId(thread_id), "user_id": user_id})
+            with span("db.threads.find_one"):
+                thread = get_threads_collection().find_one({"_id": ObjectId(thread_id), "user_id": user_id})
             if not thread:
                 raise HTTPException(status_code=404, detail="Thread not found or access denied")
         else:
-            # Create new thread for new chat session
-            thread_id = create_new_thread(user_id)
+            # Create new thread for new chat session, titled with the first message
+            # until the background title job replaces it
+            thread_id = create_new_thread(user_id, truncated_title(user_text))
 
         # Save user message
         save_message(user_id, thread_id, "user", user_text)
 
-        # Update thread title with first message if it's a new thread
-        if not request.thread_id or request.thread_id.startswith("temp-"):
-            # This is a new thread, update the title with the first message
-            thread_title = user_text[:50] + "..." if len(user_text) > 50 else user_text
-            threads_collection.update_one(
-                {"_id": ObjectId(thread_id)},
-                {"$set": {"title": thread_title}}
-            )
-
         # Fetch latest 10 messages for context
-        history_cursor = chats_collection.find(
-            {"user_id": user_id, "thread_id": thread_id}
-        ).sort("timestamp", -1).limit(10)
-        history = list(history_cursor)[::-1]
+        with span("db.chats.history"):
+            history_cursor = get_chats_collection().find(
+                {"user_id": user_id, "thread_id": thread_id}
+            ).sort("timestamp", -1).limit(10)
+            history = list(history_cursor)[::-1]
 
         messages = [{"role": doc["role"], "content": doc["content"]} for doc in history]
 
         async def generate_stream():
             try:
                 # Send initial metadata
-                yield f"data: {json.dumps({'type': 'start', 'thread_id': thread_id})}\n\n"
+                yield sse_event({'type': 'start', 'thread_id': thread_id})
                 
                 # Stream the AI response
-                result = Runner.run_streamed(triage_agent, messages)
+                started = time.perf_counter()
+                first_token_at = None
+                triage_agent = get_triage_agent()
+                # The run's background task copies the usage scope when it starts
+                with usage_scope(user_id, thread_id):
+                    result = Runner.run_streamed(triage_agent, messages)
                 full_response = ""
                 
                 async for event in result.stream_events():
-                    # Debug: print all events to see what we're getting
-                    print(f"Streaming event: {event.type} - {event}")
-                    
                     # Handle specific event types based on the actual structure
                     if event.type == "raw_response_event":
                         # Check if this is a ResponseTextDeltaEvent
                         if hasattr(event, 'data') and hasattr(event.data, 'delta'):
                             delta = event.data.delta
-                            print(f"Found delta in raw_response_event: '{delta}'")
                             if delta:  # Only send non-empty deltas
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                    llm_ttft.observe(first_token_at - started, agent=triage_agent.name)
+                                    record_span("llm.ttft", first_token_at - started)
                                 full_response += delta
-                                print(f"Sending delta: '{delta}'")
-                                yield f"data: {json.dumps({'type': 'delta', 'content': delta})}\n\n"
+                                yield sse_event({'type': 'delta', 'content': delta})
                     
                     elif event.type == "response.content_part.done":
                         # This event contains the complete text content
                         if hasattr(event, 'part') and hasattr(event.part, 'text'):
                             text = event.part.text
-                            print(f"Found text in content_part.done: '{text}'")
                             if text:  # Only send non-empty text
                                 full_response += text
-                                print(f"Sending delta: '{text}'")
-                                yield f"data: {json.dumps({'type': 'delta', 'content': text})}\n\n"
+                                yield sse_event({'type': 'delta', 'content': text})
                 
-                # Save the complete assistant reply
-                save_message(user_id, thread_id, "assistant", full_response)
+                record_span("agent.run_streamed", time.perf_counter() - started)
+
+                # Thread stats and the title are filled in after the stream closes
+                save_reply(user_id, thread_id, user_text, full_response, new_thread)
                 
                 # Send completion signal
-                yield f"data: {json.dumps({'type': 'done', 'full_response': full_response})}\n\n"
+                yield sse_event({'type': 'done', 'full_response': full_response})
                 
             except Exception as e:
-                print(f"Error in streaming: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+                logger.exception("Error in streaming: %s", e)
+                yield sse_event({'type': 'error', 'error': str(e)})
 
-        return StreamingResponse(
+        return GuardedStreamingResponse(
             generate_stream(),
+            on_close=lambda: agent_admission.release(user_id),
             media_type="text/plain",
             headers={
                 "Cache-Control": "no-cache",
@@ -150,7 +230,8 @@ async def chat_stream_endpoint(
         )
 
     except Exception as e:
-        print("Error in streaming chat endpoint:", str(e))
+        agent_admission.release(user_id)
+        logger.exception("Error in streaming chat endpoint: %s", e)
         error_detail = str(e) if e else "Unknown error occurred"
         raise HTTPException(status_code=500, detail=error_detail)
 
@@ -159,52 +240,49 @@ async def chat_endpoint(
     request: ChatRequest = Body(...),
     current_user: dict = Depends(get_current_user)
 ) -> Dict:
+    user_id = str(current_user["user_id"])
+    await usage_recorder.check_budget(user_id)
+    await agent_admission.acquire(user_id)
     try:
-        print(f"Received request: {request}")
-        print(f"Request user_input: {request.user_input}")
-        print(f"Request thread_id: {request.thread_id}")
+        logger.info("Chat request thread_id=%s", request.thread_id)
         
-        user_id = str(current_user["user_id"])
         user_text = request.user_input.strip()
         if not user_text:
             raise HTTPException(status_code=400, detail="User input cannot be empty.")
 
         # ✅ Create new thread for each chat session or use provided thread_id
-        if request.thread_id and not request.thread_id.startswith("temp-"):
+        new_thread = not request.thread_id or request.thread_id.startswith("temp-")
+        if not new_thread:
             # Use existing thread if provided and not a temporary ID
             thread_id = request.thread_id
             # Verify thread belongs to user
-            thread = threads_collection.find_one({"_id": ObjectId(thread_id), "user_id": user_id})
+            with span("db.threads.find_one"):
+                thread = get_threads_collection().find_one({"_id": ObjectId(thread_id), "user_id": user_id})
             if not thread:
                 raise HTTPException(status_code=404, detail="Thread not found or access denied")
         else:
-            # Create new thread for new chat session
-            thread_id = create_new_thread(user_id)
+            # Create new thread for new chat session, titled with the first message
+            # until the background title job replaces it
+            thread_id = create_new_thread(user_id, truncated_title(user_text))
 
         # Save user message
         save_message(user_id, thread_id, "user", user_text)
 
-        # Update thread title with first message if it's a new thread
-        if not request.thread_id or request.thread_id.startswith("temp-"):
-            # This is a new thread, update the title with the first message
-            thread_title = user_text[:50] + "..." if len(user_text) > 50 else user_text
-            threads_collection.update_one(
-                {"_id": ObjectId(thread_id)},
-                {"$set": {"title": thread_title}}
-            )
-
-        # Fetch latest 10 messages for context
-        history_cursor = chats_collection.find(
-            {"user_id": user_id, "thread_id": thread_id}
-        ).sort("timestamp", -1).limit(10)
-        history = list(history_cursor)[::-1]
+        # Full thread history for the response; the latest 10 messages are the context
+        with span("db.chats.full_history"):
+            full_history = list(get_chats_collection().aggregate([
+                {"$match": {"user_id": user_id, "thread_id": thread_id}},
+                {"$sort": {"timestamp": 1}},
+                {"$project": {"_id": 1, "thread_id": 1, "role": 1, "content": 1, "timestamp": 1}},
+                *string_id_stages("id"),
+            ]))
 
-        messages = [{"role": doc["role"], "content": doc["content"]} for doc in history]
+        messages = [{"role": doc["role"], "content": doc["content"]} for doc in full_history[-10:]]
 
         # AI agent response
-        result = await Runner.run(triage_agent, messages)
-        print(f"Agent result type: {type(result)}")
-        print(f"Agent result: {result}")
+        with span("agent.run"), usage_scope(user_id, thread_id):
+            result = await Runner.run(get_triage_agent(), messages)
+        logger.debug("Agent result type: %s", type(result).__name__)
         
         # Handle different possible result structures
         if hasattr(result, 'final_output'):
@@ -216,44 +294,32 @@ async def chat_endpoint(
         else:
             assistant_reply = str(result) if result else "I'm sorry, I couldn't generate a response."
 
-        # Save assistant reply
-        save_message(user_id, thread_id, "assistant", assistant_reply)
-
-        # Return full thread history
-        full_history_cursor = chats_collection.find(
-            {"user_id": user_id, "thread_id": thread_id}
-        ).sort("timestamp", 1)
-        full_history = [
-            {
-                "id": str(doc["_id"]),
-                "thread_id": doc["thread_id"],
-                "role": doc["role"],
-                "content": doc["content"],
-                "timestamp": doc["timestamp"]
-            }
-            for doc in full_history_cursor
-        ]
+        full_history.append(save_reply(user_id, thread_id, user_text, assistant_reply, new_thread))
 
-        return {
+        return FastJSONResponse({
             "user_id": user_id,
             "thread_id": thread_id,
             "response": assistant_reply,
             "history": full_history
-        }
+        })
 
     except Exception as e:
-        print("Error in chat endpoint:", str(e))
+        logger.exception("Error in chat endpoint: %s", e)
         error_detail = str(e) if e else "Unknown error occurred"
         raise HTTPException(status_code=500, detail=error_detail)
+    finally:
+        agent_admission.release(user_id)
 
 @chat.get("/threads")
 async def get_threads(current_user: dict = Depends(get_current_user)):
     user_id = str(current_user["user_id"])
-    threads = list(threads_collection.find({"user_id": user_id}).sort("created_at", -1))
-    for t in threads:
-        t["id"] = str(t["_id"])
-        del t["_id"]
-    return {"threads": threads}
+    with span("db.threads.list"):
+        threads = list(get_threads_collection().aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$sort": {"created_at": -1}},
+            *string_id_stages("id"),
+        ]))
+    return FastJSONResponse({"threads": threads})
 
 @chat.post("/threads/new")
 async def create_new_thread_endpoint(current_user: dict = Depends(get_current_user)):
@@ -265,12 +331,15 @@ async def create_new_thread_endpoint(current_user: dict = Depends(get_current_us
 @chat.get("/threads/{thread_id}")
 async def get_thread_messages(thread_id: str, current_user: dict = Depends(get_current_user)):
     user_id = str(current_user["user_id"])
-    thread = threads_collection.find_one({"_id": ObjectId(thread_id), "user_id": user_id})
+    with span("db.threads.find_one"):
+        thread = get_threads_collection().find_one({"_id": ObjectId(thread_id), "user_id": user_id})
     if not thread:
         raise HTTPException(status_code=404, detail="Thread not found")
 
-    messages = list(chats_collection.find({"thread_id": thread_id}).sort("timestamp", 1))
-    for m in messages:
-        m["id"] = str(m["_id"])
-        del m["_id"]
-    return {"thread_id": thread_id, "messages": messages}
+    with span("db.chats.list"):
+        messages = list(get_chats_collection().aggregate([
+            {"$match": {"thread_id": thread_id}},
+            {"$sort": {"timestamp": 1}},
+            *string_id_stages("id"),
+        ]))
+    return FastJSONResponse({"thread_id": thread_id, "messages": messages})
@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from config.database import ping_db
+from tools.general_info import documents_loaded, get_split_docs
+from config.llm_providers import get_agent_pool, get_rag_pool
+import asyncio
+import os
+
+health_router = APIRouter()
+
+# Upper bound on how long /readyz waits for MongoDB to answer a ping
+READINESS_DB_TIMEOUT_SECONDS = float(os.getenv("READINESS_DB_TIMEOUT_SECONDS", "2"))
+
+
+async def check_mongo():
+    try:
+        await asyncio.wait_for(asyncio.to_thread(ping_db), READINESS_DB_TIMEOUT_SECONDS)
+        return {"ready": True}
+    except asyncio.TimeoutError:
+        return {"ready": False, "error": "ping timed out"}
+    except Exception as e:
+        return {"ready": False, "error": str(e)}
+
+
+def check_knowledge_base():
+    if not documents_loaded():
+        return {"ready": False, "error": "still loading"}
+    return {"ready": True, "chunks": len(get_split_docs())}
+
+
+def check_llm_pool(pool):
+    providers = pool.status()
+    if not providers:
+        return {"ready": False, "error": "no provider configured", "providers": providers}
+    ready = any(p["circuit"] != "open" for p in providers.values())
+    return {"ready": ready, "providers": providers}
+
+
+@health_router.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok"}
+
+
+@health_router.get("/readyz")
+async def readyz():
+    """Readiness probe with a per-dependency status breakdown"""
+    checks = {
+        "mongodb": await check_mongo(),
+        "knowledge_base": check_knowledge_base(),
+        "agent_llm": check_llm_pool(get_agent_pool()),
+        "rag_llm": check_llm_pool(get_rag_pool()),
+    }
+    ready = all(check["ready"] for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks},
+    )
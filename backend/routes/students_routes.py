@@ -1,22 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from typing import List, Dict, Any
-from config.database import get_db
+from config.database import get_db, string_id_stages
 from utils.auth_utils import get_current_user
+from utils.student_events import student_events
+from utils.metrics import traced
+from utils.logger import get_logger
+from utils.json_response import FastJSONResponse, json_dumps
+from utils.singleflight import SingleFlight, SingleFlightTimeout
+from utils.streaming import GuardedStreamingResponse
 import asyncio
 
 students_router = APIRouter()
+logger = get_logger(__name__)
 
+# How long an idle /students/events connection waits before sending a keep-alive
+STUDENT_EVENTS_KEEPALIVE_SECONDS = 15
+
+# Dashboard loads arriving together share one collection scan
+students_flight = SingleFlight("students")
+
+@traced("db.students.find")
 def fetch_students_data():
     """Regular function to fetch students data from database"""
     try:
         db = get_db()
         collection = db["students"]
         
-        students = collection.find({})
-        students_list = []
-        for stud in students:
-            stud["_id"] = str(stud["_id"])  # Convert ObjectId to string
-            students_list.append(stud)
+        # _id is converted to a string by MongoDB, not row by row here
+        students_list = list(collection.aggregate(string_id_stages()))
         
         return {
             "Data": students_list,
@@ -30,6 +41,13 @@ def fetch_students_data():
             "Message": str(e)
         }
 
+async def fetch_students_shared():
+    """fetch_students_data, shared with concurrent callers; the result must not be mutated"""
+    try:
+        return await students_flight.do("all", asyncio.to_thread, fetch_students_data)
+    except SingleFlightTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
 @students_router.get("/test")
 async def test_endpoint():
     """Test endpoint to check if the router is working"""
@@ -48,40 +66,61 @@ async def test_auth_endpoint(current_user: dict = Depends(get_current_user)):
 async def get_all_students(current_user: dict = Depends(get_current_user)):
     """Get all students for dashboard display"""
     try:
-        print(f"Getting students for user: {current_user.get('user_id', 'unknown')}")
+        logger.debug("Getting students for user %s", current_user.get("user_id", "unknown"))
         
-        # Use the regular function to fetch students
-        result = fetch_students_data()
-        print(f"Read students result: {result}")
+        result = await fetch_students_shared()
         
         if result.get("Error", False):
             error_msg = result.get("Message", "Failed to fetch students")
-            print(f"Error in read_students: {error_msg}")
+            logger.error("Error in read_students: %s", error_msg)
             raise HTTPException(status_code=500, detail=error_msg)
         
         students_data = result.get("Data", [])
-        print(f"Found {len(students_data)} students")
+        logger.debug("Found %d students", len(students_data))
         
-        return {
+        # Returned as a response so FastAPI skips its jsonable_encoder pass
+        return FastJSONResponse({
             "Data": students_data,
             "total": len(students_data),
             "message": "Students fetched successfully"
-        }
+        })
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Unexpected error in get_all_students: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unexpected error in get_all_students: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching students: {str(e)}")
 
+@students_router.get("/students/events")
+async def student_events_stream(request: Request, current_user: dict = Depends(get_current_user)):
+    """Push student inserts, updates and deletes to the dashboard as SSE diffs"""
+    subscription = await student_events.subscribe()
+
+    async def event_stream():
+        yield b"data: " + json_dumps({"type": "ready"}) + b"\n\n"
+        while not await request.is_disconnected():
+            batch = await subscription.next_batch(STUDENT_EVENTS_KEEPALIVE_SECONDS)
+            if batch is None:
+                yield b": keep-alive\n\n"
+                continue
+            yield b"data: " + json_dumps(batch) + b"\n\n"
+
+    return GuardedStreamingResponse(
+        event_stream(),
+        on_close=lambda: student_events.unsubscribe(subscription),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
 @students_router.get("/students/stats")
 async def get_student_stats(current_user: dict = Depends(get_current_user)):
     """Get student statistics for dashboard"""
     try:
         # Get all students
-        result = fetch_students_data()
+        result = await fetch_students_shared()
         
         if result.get("Error", False):
             raise HTTPException(status_code=500, detail=result.get("Message", "Failed to fetch students"))
@@ -100,13 +139,15 @@ async def get_student_stats(current_user: dict = Depends(get_current_user)):
         # Recent students (last 5)
         recent_students = students_data[-5:] if len(students_data) > 5 else students_data
         
-        return {
+        return FastJSONResponse({
             "total_students": total_students,
             "departments": departments,
             "recent_students": recent_students,
             "department_count": len(departments)
-        }
+        })
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in get_student_stats: {e}")
+        logger.exception("Error in get_student_stats: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching student stats: {str(e)}")
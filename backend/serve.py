@@ -0,0 +1,110 @@
+"""Production entry point: gunicorn master + uvicorn workers.
+
+    python serve.py --workers 4 --port 8000
+
+Every option can also be set through the environment (WEB_WORKERS, PORT, ...).
+``python main.py`` remains the single-process auto-reloading dev server.
+
+The app is imported once in the master and read-only state (the RAG chunks) is
+loaded before forking, so workers share those pages copy-on-write instead of
+each loading its own copy. Connections (MongoDB, LLM clients) are still created
+lazily inside each worker, since they are not fork-safe.
+"""
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+load_dotenv()
+
+
+def _default_workers() -> int:
+    return int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count()))
+
+
+class ProductionUvicornWorker(UvicornWorker):
+    # Prefer the C event loop and HTTP parser; fall back if they are not installed
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+    }
+
+
+def preload_shared_state(server):
+    """Runs in the master before any worker is forked."""
+    from tools.general_info import get_split_docs
+    from utils.auth_utils import calibrate_bcrypt_rounds
+    from utils.logger import setup_logging
+
+    # Workers inherit the handlers and restart the listener thread after fork
+    setup_logging()
+
+    # One calibration for all workers: per-worker timings differ, and so would their costs
+    server.log.info("bcrypt cost: %d rounds", calibrate_bcrypt_rounds())
+    chunks = get_split_docs()
+    server.log.info("Preloaded %d knowledge-base chunks before fork", len(chunks))
+    # Move everything allocated so far out of the GC's reach so collections in the
+    # workers don't write to (and thereby un-share) these pages.
+    gc.freeze()
+
+
+class ProductionServer(BaseApplication):
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+
+        return import_app(self.app_uri)
+
+
+def build_options(args) -> dict:
+    return {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": ProductionUvicornWorker,
+        "preload_app": True,
+        "when_ready": preload_shared_state,
+        # Graceful drain: on SIGTERM workers stop accepting and get this long to finish
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.worker_timeout,
+        "keepalive": args.keepalive,
+        "backlog": args.backlog,
+        # Recycle workers now and then to bound memory growth; jitter avoids
+        # all workers restarting at once
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10 if args.max_requests else 0,
+        "accesslog": "-" if args.access_log else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with multiple uvicorn workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=_default_workers())
+    parser.add_argument("--keepalive", type=int, default=int(os.getenv("KEEPALIVE_SECONDS", "5")))
+    parser.add_argument("--backlog", type=int, default=int(os.getenv("LISTEN_BACKLOG", "2048")))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30")))
+    parser.add_argument("--worker-timeout", type=int, default=int(os.getenv("WORKER_TIMEOUT_SECONDS", "120")))
+    parser.add_argument("--max-requests", type=int, default=int(os.getenv("MAX_REQUESTS_PER_WORKER", "0")))
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    ProductionServer("main:app", build_options(args)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
-from agents import Agent, OpenAIChatCompletionsModel, ModelSettings, Runner  # type: ignore
-from openai import AsyncOpenAI  # type: ignore
+from agents import Agent, ModelSettings, Runner  # type: ignore
+from config.llm_providers import get_agent_pool
 from tools.crud_tool import  add_student,read_students, update_student, delete_student,read_student_by_id
 from tools.general_info import rag_query
 from dotenv import load_dotenv
-import os
+import threading
 
-openai_client = AsyncOpenAI(
-    api_key=os.getenv("GEMINI_API_KEY"),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-)
-triage_agent = Agent(
-    name="Student Record Management Agent",
-    instructions="""
+_triage_agent = None
+_agent_lock = threading.Lock()
+
+
+def get_triage_agent() -> Agent:
+    """Build the triage agent on first use, backed by the LLM_PROVIDERS pool."""
+    global _triage_agent
+    if _triage_agent is None:
+        with _agent_lock:
+            if _triage_agent is None:
+                _triage_agent = Agent(
+                    name="Student Record Management Agent",
+                    instructions="""
 You are an AI assistant that helps manage student records. You can perform the following actions:
 1. Add a new student record.
 2. Read existing student records.
@@ -19,10 +25,12 @@ You are an AI assistant that helps manage student records. You can perform the f
 4. Delete student records.
 5. Answer general questions about students using the RAG tool.
     """,
-    model=OpenAIChatCompletionsModel(
-        model="gemini-2.5-flash",
-        openai_client=openai_client
-    ),
-    tools=[read_students, add_student, delete_student, update_student, read_student_by_id, rag_query],
-    model_settings=ModelSettings(temperature=0.7, max_tokens=1000),
-)
\ No newline at end of file
+                    model=get_agent_pool().as_agent_model(),
+                    tools=[read_students, add_student, delete_student, update_student, read_student_by_id, rag_query],
+                    # include_usage: streamed turns report token usage too
+                    # parallel_tool_calls: several lookups in one turn come back together and run concurrently
+                    model_settings=ModelSettings(
+                        temperature=0.7, max_tokens=1000, include_usage=True, parallel_tool_calls=True
+                    ),
+                )
+    return _triage_agent
@@ -0,0 +1,135 @@
+"""Shared fixtures. Tests run offline: stub LLM providers and an in-memory MongoDB.
+
+    pip install pytest mongomock
+    python -m pytest
+
+``async def`` tests run on a fresh event loop each (see pytest_pyfunc_call),
+so pytest-asyncio is not needed.
+"""
+import asyncio
+import inspect
+import os
+
+# Before any app module reads its configuration
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:1")
+os.environ.setdefault("LLM_PROVIDERS", "stub")
+os.environ.setdefault("RAG_LLM_PROVIDERS", "stub")
+os.environ.setdefault("STUB_LLM_LATENCY_MS", "0")
+os.environ.setdefault("STUB_LLM_TOKEN_DELAY_MS", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+
+import mongomock
+import pytest
+
+import config.database as database
+import config.llm_providers as llm_providers
+import utils.admission as admission
+import utils.auth_utils as auth_utils
+import utils.student_events as student_events
+import utils.task_queue as task_queue
+from utils import password_hashing
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    arguments = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(pyfuncitem.obj(**arguments))
+    return True
+
+
+@pytest.fixture
+def mongo():
+    """Points get_db() at a fresh in-memory database."""
+    previous = database._client
+    database._client = mongomock.MongoClient()
+    yield database.get_db()
+    database._client = previous
+
+
+@pytest.fixture
+def app():
+    """The application, with every request authenticated as user ``u1``."""
+    from main import app
+    from utils.auth_utils import get_current_user
+
+    app.dependency_overrides[get_current_user] = lambda: {"user_id": "u1"}
+    yield app
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def disconnect_before_start(app):
+    """Sends one request from a client that is gone before the response starts.
+
+    The app's first ``http.response.start`` fails, as it does when the
+    connection dropped while the endpoint was still preparing its response.
+    """
+    async def request(method: str, path: str, body: bytes = b"", headers=()):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": b"", "headers": list(headers),
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            # Starlette keeps listening for a disconnect; a request that never
+            # ends would have it spin
+            return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                raise OSError("client went away")
+
+        with pytest.raises(OSError):
+            await app(scope, receive, send)
+
+    return request
+
+
+@pytest.fixture
+def admission_limits(monkeypatch):
+    """One agent slot in total, generous rate limits, a short queue timeout."""
+    monkeypatch.setattr(admission, "AGENT_MAX_CONCURRENT", 1)
+    monkeypatch.setattr(admission, "AGENT_MAX_CONCURRENT_PER_USER", 1)
+    monkeypatch.setattr(admission, "AGENT_RATE_PER_MINUTE", 6000)
+    monkeypatch.setattr(admission, "AGENT_RATE_BURST", 100)
+    monkeypatch.setattr(admission, "AGENT_QUEUE_TIMEOUT_SECONDS", 0.2)
+
+
+@pytest.fixture
+def fast_poll(monkeypatch):
+    """Student event pollers re-read the collection every 10 ms."""
+    monkeypatch.setattr(student_events, "STUDENT_EVENTS_POLL_SECONDS", 0.01)
+
+
+@pytest.fixture
+def fast_hedge(monkeypatch):
+    """Provider pools hedge to the next provider after 10 ms."""
+    monkeypatch.setattr(llm_providers, "LLM_HEDGING", True)
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_DEFAULT_DELAY_SECONDS", 0.01)
+
+
+@pytest.fixture
+def queue_settings(monkeypatch):
+    """One background worker, two in-process attempts, near-instant retries."""
+    monkeypatch.setattr(task_queue, "TASK_QUEUE_CONCURRENCY", 1)
+    monkeypatch.setattr(task_queue, "TASK_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(task_queue, "TASK_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(task_queue, "TASK_QUEUE_DRAIN_SECONDS", 0.05)
+
+
+@pytest.fixture
+def fast_bcrypt(monkeypatch):
+    """bcrypt at its lowest accepted cost; the hashing pool is shut down afterwards."""
+    monkeypatch.setattr(auth_utils, "BCRYPT_ROUNDS", password_hashing.MIN_ROUNDS)
+    monkeypatch.setattr(auth_utils, "BCRYPT_TARGET_MS", 0)
+    monkeypatch.setattr(auth_utils, "_bcrypt_rounds", None)
+    monkeypatch.setattr(auth_utils, "_bcrypt_calibration", None)
+    yield
+    auth_utils.shutdown_hash_pool()
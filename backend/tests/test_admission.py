@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from utils.admission import AdmissionController
+
+
+async def test_waiters_are_served_round_robin_across_users(admission_limits):
+    controller = AdmissionController()
+    await controller.acquire("a")
+    granted = []
+
+    async def request(user_id, label):
+        await controller.acquire(user_id)
+        granted.append(label)
+
+    # "a" queues two requests before "b" queues one
+    tasks = [asyncio.create_task(request("a", "a2")), asyncio.create_task(request("a", "a3"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("b", "b1")))
+    await asyncio.sleep(0)
+
+    for user_id in ("a", "a", "b"):
+        controller.release(user_id)
+        await asyncio.sleep(0)
+    controller.release("a")
+    await asyncio.gather(*tasks)
+
+    assert granted == ["a2", "b1", "a3"]
+    assert controller._active_total == 0 and controller._active == {}
+
+
+async def test_cancelled_waiter_leaves_queue_and_gets_no_slot(admission_limits):
+    controller = AdmissionController()
+    await controller.acquire("a")
+    waiting = asyncio.create_task(controller.acquire("b"))
+    await asyncio.sleep(0)
+    assert controller._queued_total == 1
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+    assert controller._queued_total == 0 and not controller._queues
+
+    controller.release("a")
+    assert controller._active_total == 0 and controller._active == {}
+
+
+async def test_queue_timeout_is_a_429_with_retry_after(admission_limits):
+    controller = AdmissionController()
+    await controller.acquire("a")
+    with pytest.raises(HTTPException) as rejected:
+        await controller.acquire("b")
+
+    assert rejected.value.status_code == 429 and rejected.value.headers["Retry-After"] == "1"
+    assert controller._queued_total == 0 and controller._active == {"a": 1}
+
+
+async def test_stream_releases_slot_when_client_disconnects_before_start(mongo, disconnect_before_start):
+    from utils.admission import agent_admission
+
+    body = json.dumps({"user_input": "hello"}).encode()
+    for _ in range(3):
+        await disconnect_before_start(
+            "POST", "/chat/stream", body, headers=[(b"content-type", b"application/json")]
+        )
+    assert agent_admission._active.get("u1") is None
+    assert agent_admission._active_total == 0
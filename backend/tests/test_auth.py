@@ -0,0 +1,129 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+import jwt
+import pytest
+from passlib.hash import bcrypt
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import utils.auth_utils as auth_utils
+from utils import password_hashing
+from utils.auth_utils import create_access_token, create_refresh_token, get_current_user, token_digest
+
+
+def add_user(mongo, email: str = "ada@example.com", password: str = "unused") -> str:
+    result = mongo["signup"].insert_one({"name": "Ada", "email": email, "password": password})
+    return str(result.inserted_id)
+
+
+async def test_cached_token_stops_validating_after_exp(monkeypatch):
+    monkeypatch.setattr(auth_utils, "_token_cache", OrderedDict())
+    token = create_access_token({"user_id": "u1"}, expires_delta=timedelta(seconds=1))
+
+    assert await get_current_user(token) == {"user_id": "u1"}
+    assert auth_utils._cached_user_id(token_digest(token)) == "u1"
+
+    exp = jwt.decode(token, options={"verify_signature": False})["exp"]
+    await asyncio.sleep(max(0.0, exp - time.time()) + 0.05)
+
+    assert auth_utils._cached_user_id(token_digest(token)) is None
+    with pytest.raises(HTTPException) as raised:
+        await get_current_user(token)
+    assert raised.value.status_code == 401
+    assert token_digest(token) not in auth_utils._token_cache
+
+
+def test_token_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(auth_utils, "_token_cache", OrderedDict())
+    monkeypatch.setattr(auth_utils, "TOKEN_CACHE_SIZE", 2)
+    exp = time.time() + 60
+
+    auth_utils._cache_user_id("a", "u1", exp)
+    auth_utils._cache_user_id("b", "u2", exp)
+    assert auth_utils._cached_user_id("a") == "u1"  # b is now the oldest
+    auth_utils._cache_user_id("c", "u3", exp)
+
+    assert list(auth_utils._token_cache) == ["a", "c"]
+    assert auth_utils._cached_user_id("b") is None
+
+
+def test_refresh_token_works_once(app, mongo):
+    user_id = add_user(mongo)
+    first = create_refresh_token(mongo["refresh_tokens"], user_id)
+    client = TestClient(app)
+
+    response = client.post("/auth/refresh", json={"refresh_token": first})
+    assert response.status_code == 200
+    rotated = response.json()["data"]["refresh_token"]
+    assert rotated != first
+    assert jwt.decode(response.json()["data"]["token"], auth_utils.SECRET_KEY, algorithms=["HS256"])["user_id"] == user_id
+
+    reused = client.post("/auth/refresh", json={"refresh_token": first})
+    assert reused.status_code == 401
+
+    assert client.post("/auth/refresh", json={"refresh_token": rotated}).status_code == 200
+    assert mongo["refresh_tokens"].count_documents({"user_id": user_id}) == 1
+
+
+def test_reset_password_revokes_refresh_tokens(app, mongo, fast_bcrypt):
+    user_id = add_user(mongo)
+    other_user_id = add_user(mongo, "grace@example.com")
+    token = create_refresh_token(mongo["refresh_tokens"], user_id)
+    create_refresh_token(mongo["refresh_tokens"], user_id)
+    create_refresh_token(mongo["refresh_tokens"], other_user_id)
+    client = TestClient(app)
+
+    response = client.post("/auth/reset-password", json={
+        "email": "ada@example.com", "new_password": "n3w-secret", "confirm_password": "n3w-secret",
+    })
+
+    assert response.status_code == 200
+    assert mongo["refresh_tokens"].count_documents({"user_id": user_id}) == 0
+    assert mongo["refresh_tokens"].count_documents({"user_id": other_user_id}) == 1
+    assert client.post("/auth/refresh", json={"refresh_token": token}).status_code == 401
+
+
+def test_rehash_upgrades_a_lower_cost():
+    low = password_hashing.hash_password("s3cret", password_hashing.MIN_ROUNDS)
+
+    valid, new_hash = password_hashing.verify_and_rehash("s3cret", low, password_hashing.MIN_ROUNDS + 1)
+
+    assert valid
+    assert bcrypt.from_string(new_hash).rounds == password_hashing.MIN_ROUNDS + 1
+    assert bcrypt.verify("s3cret", new_hash)
+
+
+def test_rehash_never_downgrades_a_higher_cost():
+    high = password_hashing.hash_password("s3cret", password_hashing.MIN_ROUNDS + 1)
+
+    assert password_hashing.verify_and_rehash("s3cret", high, password_hashing.MIN_ROUNDS) == (True, None)
+    assert password_hashing.verify_and_rehash("wrong", high, password_hashing.MIN_ROUNDS + 2) == (False, None)
+
+
+def test_login_stores_the_upgraded_hash(app, mongo, fast_bcrypt, monkeypatch):
+    monkeypatch.setenv("API_KEY", "test-key")
+    monkeypatch.setattr(auth_utils, "BCRYPT_ROUNDS", password_hashing.MIN_ROUNDS + 1)
+    add_user(mongo, password=password_hashing.hash_password("s3cret", password_hashing.MIN_ROUNDS))
+
+    response = TestClient(app).post(
+        "/auth/login", json={"email": "ada@example.com", "password": "s3cret"}, headers={"x-api-key": "test-key"},
+    )
+
+    assert response.json()["status"] == "success"
+    stored = mongo["signup"].find_one({"email": "ada@example.com"})["password"]
+    assert bcrypt.from_string(stored).rounds == password_hashing.MIN_ROUNDS + 1
+
+
+def test_full_hashing_queue_returns_503(app, mongo, fast_bcrypt, monkeypatch):
+    monkeypatch.setattr(auth_utils, "BCRYPT_MAX_QUEUE", 0)
+
+    response = TestClient(app).post(
+        "/auth/register", json={"name": "Ada", "email": "ada@example.com", "password": "s3cret"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert mongo["signup"].count_documents({}) == 0
@@ -0,0 +1,101 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import utils.compression as compression
+from utils.compression import CompressionMiddleware, choose_encoding
+
+BIG = {"rows": [{"name": f"student {i}", "department": "physics"} for i in range(100)]}
+
+
+def make_client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/big")
+    def big():
+        return JSONResponse(BIG, headers={"Vary": "Authorization"})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("x" * 1023)
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["data: " + "x" * 2000 + "\n\n"]), media_type="text/event-stream")
+
+    @app.get("/chunks")
+    def chunks():
+        return StreamingResponse(iter(["y" * 2000, "z" * 2000]), media_type="text/plain")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("gzip;q=0, *;q=0", None),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("deflate", None),
+])
+def test_negotiation(header, expected):
+    assert choose_encoding(header) == expected
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_brotli_preferred_on_ties():
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("*") == "br"
+
+
+def test_gzip_only_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip;q=0.1") == "gzip"
+    assert choose_encoding("br") is None
+
+
+def test_compresses_large_json_and_adds_vary():
+    response = make_client().get("/big", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Authorization, Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json() == BIG
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed")
+def test_compresses_with_brotli():
+    response = make_client().get("/big", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.headers["content-encoding"] == "br"
+    assert response.json() == BIG
+
+
+@pytest.mark.parametrize("header", ["identity", "gzip;q=0", ""])
+def test_identity_when_nothing_acceptable(header):
+    response = make_client().get("/big", headers={"Accept-Encoding": header})
+
+    assert "content-encoding" not in response.headers
+    assert response.json() == BIG
+
+
+def test_small_bodies_are_sent_as_is():
+    response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert response.text == "x" * 1023
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/events", b"data: " + b"x" * 2000 + b"\n\n"),
+    ("/chunks", b"y" * 2000 + b"z" * 2000),
+])
+def test_streaming_responses_pass_through(path, body):
+    with make_client().stream("GET", path, headers={"Accept-Encoding": "gzip"}) as response:
+        raw = b"".join(response.iter_raw())
+
+    assert "content-encoding" not in response.headers
+    assert raw == body
@@ -0,0 +1,55 @@
+from benchmarks.ingestion import DISCLAIMER, PARAGRAPHS, make_corpus
+from utils.ingestion import BoilerplateFilter, ingest
+
+
+def page(number: int, body) -> str:
+    return "\n".join(["University Prospectus 2026", "", *body, "", f"Page {number} of 20"])
+
+
+def test_boilerplate_filter_strips_running_header_and_footer():
+    page_filter = BoilerplateFilter(sample_pages=4)
+    bodies = {}
+    for n, chapter in enumerate("ABCDEF", start=1):
+        bodies[n] = [f"Chapter {chapter}: {paragraph}" for paragraph in PARAGRAPHS]
+        bodies[n].insert(3, "University Prospectus 2026")
+    pages = [page(n, bodies[n]) for n in range(1, 7)]
+
+    kept = []
+    for number, text in enumerate(pages, start=1):
+        kept.extend(page_filter.feed(number, text))
+    kept.extend(page_filter.finish())
+
+    assert [number for number, _ in kept] == [1, 2, 3, 4, 5, 6]
+    for number, text in kept:
+        lines = [line for line in text.splitlines() if line.strip()]
+        # The header repeated in the body is content, not boilerplate
+        assert lines == bodies[number]
+    assert page_filter.removed == 12
+
+
+def test_boilerplate_filter_keeps_short_documents_whole():
+    page_filter = BoilerplateFilter()
+    pages = [page(n, [f"Topic {n}."]) for n in (1, 2)]
+
+    kept = []
+    for number, text in enumerate(pages, start=1):
+        kept.extend(page_filter.feed(number, text))
+    kept.extend(page_filter.finish())
+
+    assert kept == [(1, pages[0]), (2, pages[1])]
+    assert page_filter.removed == 0
+
+
+def test_ingest_drops_boilerplate_and_duplicate_chunks(tmp_path):
+    make_corpus(str(tmp_path), files=3, pages=6)
+
+    documents, stats = ingest([str(tmp_path)], workers=1)
+
+    assert (stats.files, stats.pages, stats.chunks) == (3, 18, len(documents))
+    assert stats.boilerplate_lines == 3 * 6 * 2
+    assert not any("University Prospectus" in d.page_content or "Page " in d.page_content for d in documents)
+    # Every file ends with the same disclaimer page; only the first copy is kept
+    disclaimers = [d for d in documents if DISCLAIMER.split(".")[0] in d.page_content]
+    assert len(disclaimers) == 1
+    assert disclaimers[0].metadata == {"source": str(tmp_path / "prospectus_0000.pdf"), "page": 6}
+    assert stats.duplicate_chunks == 2
@@ -0,0 +1,91 @@
+import asyncio
+
+import config.llm_providers as llm_providers
+from config.llm_providers import CircuitBreaker, LatencyTracker, Provider, ProviderPool
+
+
+def make_provider(name: str, breaker: CircuitBreaker = None) -> Provider:
+    return Provider(
+        name=name, model=f"{name}-model", base_url="", api_key="", client=None,
+        breaker=breaker or CircuitBreaker(2, 60), latency=LatencyTracker(), stream_latency=LatencyTracker(),
+    )
+
+
+async def test_results_that_lose_the_race_are_discarded(fast_hedge):
+    pool = ProviderPool("test", [make_provider("a"), make_provider("b")])
+    discarded = []
+    started, release = [], asyncio.Event()
+
+    async def call(provider):
+        started.append(provider.name)
+        if len(started) == 2:
+            release.set()
+        await release.wait()
+        return provider.name
+
+    # Both calls finish in the same loop iteration
+    provider, result = await pool.run(call, discard=lambda provider, result: discarded.append(result))
+
+    assert result == provider.name
+    assert discarded == [({"a", "b"} - {result}).pop()]
+
+
+async def test_hedge_finishing_after_cancellation_is_discarded(fast_hedge):
+    pool = ProviderPool("test", [make_provider("a"), make_provider("b")])
+    discarded = []
+
+    async def call(provider):
+        if provider.name == "a":
+            # Ignores the cancellation long enough to finish anyway
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                pass
+            return "a"
+        return "b"
+
+    provider, result = await pool.run(call, discard=lambda provider, result: discarded.append(result))
+    await asyncio.sleep(0.01)
+
+    assert (provider.name, result) == ("b", "b")
+    assert discarded == ["a"]
+
+
+def test_half_open_breaker_admits_a_single_trial(monkeypatch):
+    breaker = CircuitBreaker(1, 60)
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now = llm_providers.time.monotonic()
+    monkeypatch.setattr(llm_providers.time, "monotonic", lambda: now + 61)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow() and not breaker.available()
+
+    breaker.release_trial()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow() and breaker.allow()
+
+
+async def test_concurrent_calls_skip_a_provider_whose_trial_is_running(monkeypatch):
+    flaky = make_provider("a", CircuitBreaker(1, 60))
+    flaky.breaker.record_failure()
+    flaky.breaker.opened_at -= 61  # cooldown over: half-open
+    pool = ProviderPool("test", [flaky, make_provider("b")])
+    monkeypatch.setattr(llm_providers, "LLM_HEDGING", False)
+    release = asyncio.Event()
+    used = []
+
+    async def call(provider):
+        used.append(provider.name)
+        await release.wait()
+        return provider.name
+
+    runs = [asyncio.create_task(pool.run(call)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.gather(*runs)
+
+    assert sorted(used) == ["a", "b", "b"]
+    assert flaky.breaker.state == "closed"
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from utils.singleflight import SingleFlight, SingleFlightTimeout
+
+
+async def test_concurrent_callers_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    results = await asyncio.gather(*(flight.do("k", fetch, "k") for _ in range(5)))
+    # Nothing is cached: the next caller starts a fresh call
+    again = await flight.do("k", fetch, "k")
+
+    assert calls == ["k", "k"]
+    assert all(result is results[0] for result in results) and again is not results[0]
+    assert flight.in_flight() == 0
+
+
+async def test_error_is_shared_by_every_waiter():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ConnectionError("database unavailable")
+
+    errors = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    assert calls == 1
+    assert all(isinstance(error, ConnectionError) for error in errors)
+
+
+async def test_timeout_leaves_the_shared_call_running_for_others():
+    flight = SingleFlight("test", timeout=0.01)
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "done"
+
+    leader = asyncio.create_task(flight.do("k", slow))
+    await asyncio.sleep(0)
+    # Joins the same call with a longer timeout
+    flight.timeout = 1
+    follower = asyncio.create_task(flight.do("k", slow))
+    with pytest.raises(SingleFlightTimeout):
+        await leader
+
+    assert await follower == "done"
+    assert flight.in_flight() == 0
+
+
+async def test_callers_beyond_max_waiters_run_the_call_themselves():
+    flight = SingleFlight("test", max_waiters=2)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(4)))
+
+    # The leader and one follower share the first call; the other two overflow
+    assert calls == 3
+    assert results[0] == results[1]
+
+
+def test_student_stats_timeout_is_a_503_with_retry_after(app, monkeypatch):
+    import routes.students_routes as students_routes
+
+    def slow_fetch():
+        time.sleep(0.2)
+        return {"Data": [], "Error": False, "Message": ""}
+
+    monkeypatch.setattr(students_routes, "fetch_students_data", slow_fetch)
+    monkeypatch.setattr(students_routes.students_flight, "timeout", 0.01)
+    response = TestClient(app).get("/students/stats")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
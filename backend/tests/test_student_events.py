@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+
+import utils.student_events as events
+from utils.student_events import StudentEventBroker
+
+
+async def test_poll_watcher_sends_diffs_keyed_by_object_id(mongo, fast_poll):
+    students = mongo["students"]
+    kept = students.insert_one({"id": 1, "name": "Ada", "updated_at": datetime.utcnow()}).inserted_id
+
+    broker = StudentEventBroker(source="poll")
+    subscription = await broker.subscribe()
+    # Written "elsewhere": nothing in this process publishes these changes
+    added = students.insert_one({"id": 2, "name": "Grace", "updated_at": datetime.utcnow()}).inserted_id
+    students.update_one({"_id": kept}, {"$set": {"name": "Ada L.", "updated_at": datetime.utcnow()}})
+    first = await subscription.next_batch(1)
+    students.delete_one({"_id": added})
+    second = await subscription.next_batch(1)
+    broker.unsubscribe(subscription)
+    await broker.close()
+
+    ops = {event["id"]: (event["op"], event["student"]["name"]) for event in first["events"]}
+    assert ops == {str(kept): ("update", "Ada L."), str(added): ("insert", "Grace")}
+    assert second == {"type": "diff", "events": [{"op": "delete", "id": str(added)}]}
+
+
+async def test_poll_watcher_catches_writes_without_updated_at_in_full_scans(mongo, fast_poll, monkeypatch):
+    students = mongo["students"]
+    kept = students.insert_one({"id": 1, "name": "Ada"}).inserted_id
+
+    broker = StudentEventBroker(source="poll")
+    subscription = await broker.subscribe()
+    inserted = students.insert_one({"id": 2, "name": "Grace"}).inserted_id
+    students.update_one({"_id": kept}, {"$set": {"name": "Ada L."}})
+    # The count changed, so the insert is found; the update waits for a full scan
+    first = await subscription.next_batch(1)
+    assert first["events"] == [{"op": "insert", "id": str(inserted), "student": {
+        "_id": str(inserted), "id": 2, "name": "Grace"}}]
+    assert await subscription.next_batch(0.1) is None
+
+    monkeypatch.setattr(events, "STUDENT_EVENTS_FULL_SCAN_SECONDS", 0)
+    second = await subscription.next_batch(1)
+    broker.unsubscribe(subscription)
+    await broker.close()
+    assert [(event["op"], event["student"]["name"]) for event in second["events"]] == [("update", "Ada L.")]
+
+
+async def test_watcher_stops_with_the_last_subscriber(mongo, fast_poll):
+    broker = StudentEventBroker(source="poll")
+    subscription = await broker.subscribe()
+    broker.unsubscribe(subscription)
+    await asyncio.sleep(0.1)
+    assert broker._watcher.done()
+
+
+async def test_events_stream_unsubscribes_when_client_disconnects_before_start(
+        mongo, fast_poll, disconnect_before_start, monkeypatch):
+    from utils.student_events import student_events
+
+    monkeypatch.setattr(student_events, "source", "poll")
+    await disconnect_before_start("GET", "/students/events")
+    await student_events.close()
+    assert student_events.connection_count == 0
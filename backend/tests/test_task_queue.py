@@ -0,0 +1,152 @@
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+import utils.task_queue as task_queue_module
+from utils.task_queue import TaskQueue
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.005)
+
+
+async def test_failing_job_is_retried_persisted_and_reclaimed(mongo, queue_settings):
+    jobs = mongo["jobs"]
+    queue = TaskQueue()
+    calls = []
+    healthy = False
+
+    @queue.task("flaky")
+    def flaky(student_id):
+        calls.append(student_id)
+        if not healthy:
+            raise ConnectionError("database unavailable")
+
+    queue.enqueue("flaky", student_id=7)
+    await wait_until(lambda: jobs.count_documents({}) == 1)
+    stored = jobs.find_one()
+    assert len(calls) == 2  # both in-process attempts
+    assert (stored["status"], stored["attempts"], stored["kwargs"]) == ("pending", 2, {"student_id": 7})
+    assert "database unavailable" in stored["last_error"]
+
+    healthy = True
+    await asyncio.sleep(0.02)  # past the stored run_at
+    assert await queue.poll_once() == 1
+    await wait_until(lambda: jobs.count_documents({}) == 0)
+    await queue.stop()
+    assert calls == [7, 7, 7]
+
+
+async def test_claimed_job_failing_again_goes_back_to_the_collection(mongo, queue_settings):
+    jobs = mongo["jobs"]
+    queue = TaskQueue()
+
+    @queue.task("broken")
+    async def broken():
+        raise ValueError("still broken")
+
+    await queue.start()
+    job_id = jobs.insert_one({
+        "name": "broken", "kwargs": {}, "attempts": 2, "status": "pending",
+        "run_at": datetime.utcnow(), "locked_until": None,
+    }).inserted_id
+    await wait_until(lambda: jobs.find_one({"_id": job_id})["attempts"] == 3)
+    await queue.stop()
+
+    stored = jobs.find_one({"_id": job_id})
+    assert stored["status"] == "pending" and stored["locked_until"] is None
+    assert "still broken" in stored["last_error"]
+
+
+async def test_shutdown_persists_running_queued_and_retrying_jobs(mongo, queue_settings, monkeypatch):
+    # Retries wait long enough to still be scheduled when the queue stops
+    monkeypatch.setattr(task_queue_module, "backoff", lambda attempt: 60)
+    jobs = mongo["jobs"]
+    queue = TaskQueue()
+    never = asyncio.Event()
+
+    @queue.task("fail")
+    async def fail(n):
+        raise RuntimeError("transient")
+
+    @queue.task("hang")
+    async def hang(n):
+        await never.wait()
+
+    queue.enqueue("fail", n=1)
+    await wait_until(lambda: queue._retries)
+    queue.enqueue("hang", n=2)
+    queue.enqueue("hang", n=3)
+    await wait_until(lambda: queue._running)
+    await queue.stop()
+
+    stored = sorted(jobs.find(), key=lambda job: job["kwargs"]["n"])
+    assert [(job["name"], job["kwargs"]["n"], job["last_error"]) for job in stored] == [
+        ("fail", 1, "shutdown"), ("hang", 2, "shutdown"), ("hang", 3, "shutdown"),
+    ]
+    assert stored[0]["attempts"] == 1
+
+
+async def test_jobs_beyond_the_queue_size_spill_to_the_collection(mongo, queue_settings, monkeypatch):
+    monkeypatch.setattr(task_queue_module, "TASK_QUEUE_MAX_SIZE", 1)
+    jobs = mongo["jobs"]
+    queue = TaskQueue()
+    release = asyncio.Event()
+    ran = []
+
+    @queue.task("slow")
+    async def slow(n):
+        await release.wait()
+        ran.append(n)
+
+    queue.enqueue("slow", n=1)
+    await asyncio.sleep(0)  # the worker takes job 1
+    queue.enqueue("slow", n=2)  # fills the queue
+    queue.enqueue("slow", n=3)  # spills
+    await wait_until(lambda: jobs.count_documents({}) == 1)
+    release.set()
+    await queue.stop()
+
+    assert ran == [1, 2]
+    spilled = jobs.find_one()
+    assert (spilled["kwargs"], spilled["last_error"]) == ({"n": 3}, "queue full")
+
+
+async def test_jobs_do_not_run_in_the_context_of_the_request_that_started_the_queue(mongo, queue_settings):
+    request_id = ContextVar("request_id", default="-")
+    queue = TaskQueue()
+    seen = []
+
+    @queue.task("record")
+    async def record():
+        seen.append(request_id.get())
+
+    request_id.set("first-request")
+    queue.enqueue("record")  # starts the workers lazily
+    await wait_until(lambda: seen)
+    await queue.stop()
+    assert seen == ["-"]
+
+
+def test_reply_is_stored_before_the_response_returns(mongo, app, monkeypatch):
+    from utils.task_queue import task_queue
+
+    queued = []
+    # Nothing runs the background jobs here
+    monkeypatch.setattr(task_queue, "enqueue", lambda name, **kwargs: queued.append(name))
+    client = TestClient(app)
+
+    first = client.post("/chat/", json={"user_input": "hello"}).json()
+    reply = first["history"][-1]
+    stored = mongo["chats"].find_one({"role": "assistant"})
+    assert str(stored["_id"]) == reply["id"] and stored["content"] == first["response"]
+    assert queued == ["update_thread_stats", "generate_thread_title"]
+
+    second = client.post("/chat/", json={"user_input": "and again", "thread_id": first["thread_id"]}).json()
+    assert [message["role"] for message in second["history"]] == ["user", "assistant"] * 2
+    assert second["history"][1]["id"] == reply["id"]
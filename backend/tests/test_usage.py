@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+import utils.usage as usage
+from utils.usage import UsageRecorder, usage_scope
+
+
+class FakeUsageCollection:
+    """Stored daily totals come from ``stored_tokens``; writes can be held or made to fail."""
+
+    def __init__(self, stored_tokens: int = 0):
+        self.stored_tokens = stored_tokens
+        self.written = []
+        self.fail = False
+        self.hold = None  # threading.Event the write waits for
+
+    def aggregate(self, pipeline):
+        return [{"tokens": self.stored_tokens, "cost": 0.0}] if self.stored_tokens else []
+
+    def bulk_write(self, operations, ordered=True):
+        if self.hold is not None:
+            self.hold.wait(5)
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        self.written.extend(operations)
+
+
+def record_for(recorder: UsageRecorder, user_id: str, tokens: int):
+    with usage_scope(user_id, "t1"):
+        recorder.record("agent", "stub-model", tokens, 0)
+
+
+async def test_failed_flush_merges_back_into_the_buffer(monkeypatch):
+    collection = FakeUsageCollection()
+    monkeypatch.setattr(usage, "get_usage_collection", lambda: collection)
+    recorder = UsageRecorder()
+    record_for(recorder, "u1", 100)
+
+    collection.fail = True
+    await recorder.flush()
+    record_for(recorder, "u1", 50)
+    (counters,) = recorder._pending.values()
+    assert counters["total_tokens"] == 150 and counters["requests"] == 2
+    assert await recorder.daily_totals("u1") == (150, 0.0)
+
+    collection.fail = False
+    await recorder.flush()
+    assert recorder._pending == {} and len(collection.written) == 1
+    await recorder.close()
+
+
+async def test_batch_being_written_still_counts_towards_the_budget(monkeypatch):
+    collection = FakeUsageCollection()
+    collection.hold = threading.Event()
+    monkeypatch.setattr(usage, "get_usage_collection", lambda: collection)
+    recorder = UsageRecorder()
+    record_for(recorder, "u1", 100)
+
+    flushing = asyncio.create_task(recorder.flush())
+    await asyncio.sleep(0.01)
+    assert recorder._pending == {}
+    assert await recorder.daily_totals("u1") == (100, 0.0)
+
+    collection.stored_tokens = 100  # the write lands
+    collection.hold.set()
+    await flushing
+    assert await recorder.daily_totals("u1") == (100, 0.0)
+    await recorder.close()
+
+
+def test_spent_budget_is_a_429_with_retry_after(app, monkeypatch):
+    monkeypatch.setattr(usage, "USAGE_DAILY_TOKEN_BUDGET", 1000)
+    monkeypatch.setattr(usage, "get_usage_collection", lambda: FakeUsageCollection(stored_tokens=1000))
+    monkeypatch.setattr(usage.usage_recorder, "_stored_totals", {})
+
+    response = TestClient(app).post("/chat/", json={"user_input": "hello"})
+
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 86400
+
+
+async def test_flusher_does_not_inherit_the_recording_request_context(monkeypatch):
+    from utils.logger import request_id_var
+
+    flushed_under = []
+
+    def collection():
+        flushed_under.append(request_id_var.get())
+        return FakeUsageCollection()
+
+    monkeypatch.setattr(usage, "get_usage_collection", collection)
+    monkeypatch.setattr(usage, "USAGE_FLUSH_SECONDS", 0.001)
+    recorder = UsageRecorder()
+    request_id_var.set("first-request")
+    record_for(recorder, "u1", 10)  # starts the flusher
+    await asyncio.sleep(0.05)
+
+    assert flushed_under == ["-"]
+    await recorder.close()
@@ -1,24 +1,24 @@
-from agents import Agent, OpenAIChatCompletionsModel, ModelSettings, Runner,function_tool
-from openai import AsyncOpenAI
-from config.database import get_db
-from pymongo import MongoClient
-import os
+from agents import function_tool
+from config.database import get_async_db, string_id_stages
 from dotenv import load_dotenv       
 from typing import Any
+from datetime import datetime
 from model.pydantic_model import add_stuedent
+from utils.metrics import traced
+from utils.logger import get_logger
 
 load_dotenv()
 
+logger = get_logger(__name__)
 
-db = get_db()
-collection = db["students"]
-
-print("Client is:", db)
+def get_collection():
+    # Async driver: independent tool calls in one turn run concurrently instead of blocking the loop
+    return get_async_db()["students"]
 
 
 @function_tool
-def read_students():
-    print("Fetching all students...")
+@traced("tool.read_students")
+async def read_students():
     """Fetch all students from the database.
     Returns:
         dict: A dictionary containing the list of students and any error message.
@@ -26,13 +26,11 @@ def read_students():
         None
     
         """
+    logger.debug("Fetching all students")
+    collection = get_collection()
     try:
-        students = collection.find({})
-        students_list = []
-        for stud in students:
-            stud["_id"] = str(stud["_id"])  # Convert ObjectId to string
-            students_list.append(stud)
-        print("Students fetched:", students_list)    
+        students_list = await (await collection.aggregate(string_id_stages())).to_list()
+        logger.debug("Fetched %d students", len(students_list))
 
         return {
             "Data": students_list,
@@ -49,16 +47,18 @@ def read_students():
 
 #for one student
 @function_tool
-def read_student_by_id(id: int):
-        print("Fetching student by name...")
-        """Fetch a student by name from the database.
+@traced("tool.read_student_by_id")
+async def read_student_by_id(id: int):
+        """Fetch a student by their numeric id from the database.
         Args:
-            name (str): The name of the student to fetch.
+            id (int): The numeric id of the student to fetch.
         Returns:
             dict: A dictionary containing the student data and any error message.
         """
+        logger.debug("Fetching student id=%s", id)
+        collection = get_collection()
         try:
-            student = collection.find_one({"id": id})
+            student = await collection.find_one({"id": id})
             if student:
                 student["_id"] = str(student["_id"])  # Convert ObjectId to string
                 return {
@@ -82,25 +82,30 @@ def read_student_by_id(id: int):
 
 #for add student
 @function_tool
-def add_student(id:int,name:str,email:str,department:str):
-    print("Adding student...")
+@traced("tool.add_student")
+async def add_student(id:int,name:str,email:str,department:str):
     """Add a new student to the database.
     Args:
-        add (add_stuedent): An instance of the add_stuedent model containing student details.
-        name: str - The name of the student.
         id: int - The numeric ID of the student.
+        name: str - The name of the student.
         email: str - The email address of the student.
+        department: str - The department the student belongs to.
     Returns:
         dict: A dictionary containing the result of the insertion operation.
     """
+    logger.debug("Adding student id=%s", id)
+    collection = get_collection()
     try:
-        result = collection.insert_one({
+        student = {
             "name": name, 
             "id": id, 
             "email": email, 
-            "department": department
-            })
-        print("Student added:", result.inserted_id)
+            "department": department,
+            # Lets dashboards polling for changes find this student cheaply
+            "updated_at": datetime.utcnow()
+            }
+        result = await collection.insert_one(student)
+        logger.info("Student added id=%s _id=%s", id, result.inserted_id)
         return {
             "Data": {"id": str(result.inserted_id)},
             "Error": False,
@@ -123,17 +128,19 @@ def add_student(id:int,name:str,email:str,department:str):
 
 
 @function_tool
-def delete_student(id: int):
-    print("Deleting student...")
-    """"    Delete a student by name.
+@traced("tool.delete_student")
+async def delete_student(id: int):
+    """    Delete a student by their numeric id.
         Args:
-            name (str): The name of the student to delete.
+            id (int): The numeric id of the student to delete.
         Returns:
             dict: A dictionary containing the result of the deletion operation.
 
     """
+    logger.debug("Deleting student id=%s", id)
+    collection = get_collection()
     try:
-        result = collection.delete_one({"id": id})
+        result = await collection.delete_one({"id": id})
         if result.deleted_count > 0:
             return {
                 "Data": {"id": id},
@@ -157,9 +164,8 @@ def delete_student(id: int):
 
  
 @function_tool
-def update_student(id: int, field: str, new_value: Any):
-    print("Updating student...")
-
+@traced("tool.update_student")
+async def update_student(id: int, field: str, new_value: Any):
     """
     Update a single field for a student identified by `id`.
 
@@ -171,6 +177,8 @@ def update_student(id: int, field: str, new_value: Any):
     Returns:
         dict: Result payload with success/error info.
     """
+    logger.debug("Updating student id=%s field=%s", id, field)
+    collection = get_collection()
 
     try:
         
@@ -202,10 +210,10 @@ def update_student(id: int, field: str, new_value: Any):
                 }
 
         # Build the update
-        update_doc = {"$set": {field: new_value}}
+        update_doc = {"$set": {field: new_value, "updated_at": datetime.utcnow()}}
 
         # Match by your custom integer id (NOT Mongo _id)
-        result = collection.update_one({"id": id}, update_doc)
+        result = await collection.update_one({"id": id}, update_doc)
 
         if result.matched_count == 0:
             return {
@@ -215,7 +223,7 @@ def update_student(id: int, field: str, new_value: Any):
             }
 
         # Optionally fetch the updated doc to return
-        updated = collection.find_one({"id": id})
+        updated = await collection.find_one({"id": id})
         if updated:
             updated["_id"] = str(updated["_id"])
 
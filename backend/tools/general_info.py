@@ -1,52 +1,94 @@
 
-# LangChain/Groq for RAG
-from langchain_groq import ChatGroq
-from langchain_community.document_loaders import TextLoader
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.memory import ConversationBufferWindowMemory
+# LangChain is imported lazily: it dominates cold-start time
 from agents import function_tool
+from config.llm_providers import get_rag_pool
+from utils.metrics import span, traced
+from utils.logger import get_logger
+from utils.singleflight import SingleFlight
 from dotenv import load_dotenv
+from itertools import islice
+from typing import Optional
+import asyncio
 import os
+import threading
     
 # ------------------ Load environment ------------------
 load_dotenv()
 
+logger = get_logger(__name__)
 
-# ------------------ Initialize Groq LLM for RAG ------------------
-groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY not found in environment variables!")
+# How many chunks rag_query passes to the LLM as context
+RAG_CONTEXT_CHUNKS = 10
+# Knowledge-base sources: comma-separated .txt/.md/.pdf files, directories or globs
+KNOWLEDGE_BASE_PATHS = [p.strip() for p in os.getenv("KNOWLEDGE_BASE_PATHS", "university.txt").split(",") if p.strip()]
 
-groq_llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    api_key=groq_api_key,
-    temperature=0.7,
-    max_tokens=1024
-)
+_split_docs = None
+_init_lock = threading.Lock()
 
-memory = ConversationBufferWindowMemory(k=5)
+# Concurrent rag_query calls with the same normalized question share one LLM call
+rag_flight = SingleFlight("rag_query")
 
 # ------------------ Load & Split PDF/Text Documents ------------------
-def load_documents(file_path: str = r"university.txt", chunk_size: int = 500, chunk_overlap: int = 100):
+def load_documents(file_path: Optional[str] = None, chunk_size: int = 500, chunk_overlap: int = 100):
+    """Chunk ``file_path`` (a file, directory or glob), or every KNOWLEDGE_BASE_PATHS source."""
+    paths = [file_path] if file_path else KNOWLEDGE_BASE_PATHS
     try:
-        loader = TextLoader(file_path, encoding="utf-8")
-        documents = loader.load()
-        splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        split_docs = splitter.split_documents(documents)
+        from utils.ingestion import ingest
+
+        split_docs, _ = ingest(paths, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         return split_docs
     except Exception as e:
-        print("Error loading documents:", e)
+        logger.error("Error loading documents from %s: %s", ", ".join(paths), e)
         return []
 
-split_docs = load_documents()
+def get_split_docs():
+    """Load and split the knowledge base once, on first use (or during startup warm-up)."""
+    global _split_docs
+    if _split_docs is None:
+        with _init_lock:
+            if _split_docs is None:
+                _split_docs = load_documents()
+    return _split_docs
+
+
+def documents_loaded() -> bool:
+    return _split_docs is not None
+
+
+def build_context(split_docs, max_chunks: int = RAG_CONTEXT_CHUNKS) -> str:
+    """Join the chunks used as LLM context, without touching the rest of the corpus."""
+    return "\n\n".join(doc.page_content for doc in islice(split_docs, max_chunks))
+
+def normalize_question(question: str) -> str:
+    """Coalescing key: case, spacing and trailing punctuation don't change the question"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+async def answer_question(user_question: str, split_docs) -> str:
+    # ⚡ Consider retrieving only top-k relevant chunks
+    context_text = build_context(split_docs)
+
+    prompt = (
+        f"You are a helpful assistant. Answer the user's question based on the following context.\n\n"
+        f"Context:\n{context_text}\n\n"
+        f"Question: {user_question}\n\n"
+        f"Answer concisely and clearly."
+    )
+
+    # RAG_LLM_PROVIDERS (Groq by default), with hedging and failover
+    with span("llm.rag.complete"):
+        answer, _ = await get_rag_pool().complete(
+            prompt, temperature=0.7, max_tokens=1024, source="rag_query"
+        )
+    return answer
 
 # ------------------ RAG Tool ------------------
 @function_tool
-def rag_query(user_question: str):
+@traced("tool.rag_query")
+async def rag_query(user_question: str):
     """
     Answer questions based on provided PDF/text documents using RAG.
     """
-    print("RAG Tool Invoked")
+    logger.debug("RAG tool invoked")
 
     if not user_question.strip():
         return {"Data": {}, "Error": True, "Message": "User question cannot be empty."}
@@ -55,24 +97,15 @@ def rag_query(user_question: str):
         return {"Data": {}, "Error": False, "Message": "Hello! How can I assist you today?"}
 
     try:
+        split_docs = await asyncio.to_thread(get_split_docs)
         if not split_docs:
             return {"Data": {}, "Error": True, "Message": "No documents have been loaded for querying."}
 
-        # ⚡ Consider retrieving only top-k relevant chunks
-        context_text = "\n\n".join([doc.page_content for doc in split_docs][:10])
-
-        prompt = (
-            f"You are a helpful assistant. Answer the user's question based on the following context.\n\n"
-            f"Context:\n{context_text}\n\n"
-            f"Question: {user_question}\n\n"
-            f"Answer concisely and clearly."
-        )
-
-        response = groq_llm.invoke(prompt)
-        answer = response.content if hasattr(response, "content") else str(response)
+        # The same question asked at the same time by many students costs one LLM call
+        answer = await rag_flight.do(normalize_question(user_question), answer_question, user_question, split_docs)
 
         return {
-            "Data": {"used_chunks": min(10, len(split_docs))},
+            "Data": {"used_chunks": min(RAG_CONTEXT_CHUNKS, len(split_docs))},
             "Error": False,
             "Message": answer
         }
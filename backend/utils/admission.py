@@ -0,0 +1,197 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge, Histogram
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Agent runs allowed at once, across all users and per user
+AGENT_MAX_CONCURRENT = int(os.getenv("AGENT_MAX_CONCURRENT", "32"))
+AGENT_MAX_CONCURRENT_PER_USER = int(os.getenv("AGENT_MAX_CONCURRENT_PER_USER", "2"))
+# Token bucket per user: sustained requests per minute and burst size
+AGENT_RATE_PER_MINUTE = float(os.getenv("AGENT_RATE_PER_MINUTE", "20"))
+AGENT_RATE_BURST = int(os.getenv("AGENT_RATE_BURST", "5"))
+# Waiting room: total size, share one user may hold, and how long a request may wait
+AGENT_QUEUE_SIZE = int(os.getenv("AGENT_QUEUE_SIZE", "100"))
+AGENT_QUEUE_SIZE_PER_USER = int(os.getenv("AGENT_QUEUE_SIZE_PER_USER", "4"))
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "15"))
+
+agent_active = Gauge("agent_active_requests", "Agent requests currently running")
+agent_queue_depth = Gauge("agent_queue_depth", "Agent requests waiting for a slot")
+agent_rejected = Counter(
+    "agent_admission_rejected_total", "Agent requests turned away by admission control", ("reason",),
+)
+agent_queue_wait = Histogram(
+    "agent_queue_wait_seconds", "Time agent requests spent waiting for a slot",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def is_full(self) -> bool:
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+def _rejection(reason: str, detail: str, retry_after: float) -> HTTPException:
+    agent_rejected.inc(reason=reason)
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionController:
+    """Concurrency limits, rate limits and a fair waiting room for agent requests.
+
+    Waiters are queued per user and served round-robin, so a user with many
+    queued requests cannot starve others. All state is touched from the event
+    loop only.
+    """
+
+    def __init__(self):
+        self._active_total = 0
+        self._active: Dict[str, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        # user id -> waiting futures; key order is the round-robin order
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued_total = 0
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                # Drop users whose bucket has refilled; they lose nothing
+                self._buckets = {uid: b for uid, b in self._buckets.items() if not b.is_full()}
+            bucket = self._buckets[user_id] = TokenBucket(AGENT_RATE_PER_MINUTE / 60, AGENT_RATE_BURST)
+        return bucket
+
+    def _can_run(self, user_id: str) -> bool:
+        return (self._active_total < AGENT_MAX_CONCURRENT
+                and self._active.get(user_id, 0) < AGENT_MAX_CONCURRENT_PER_USER)
+
+    def _grant(self, user_id: str):
+        self._active_total += 1
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+        agent_active.set(self._active_total)
+
+    def _update_queue_gauge(self):
+        agent_queue_depth.set(self._queued_total)
+
+    async def acquire(self, user_id: str):
+        """Wait for a slot or raise a 429 ``HTTPException`` with ``Retry-After``."""
+        wait = self._bucket(user_id).take()
+        if wait:
+            raise _rejection("rate_limited", "Too many requests, please slow down", wait)
+
+        if self._can_run(user_id) and user_id not in self._queues:
+            self._grant(user_id)
+            agent_queue_wait.observe(0.0)
+            return
+
+        user_queue = self._queues.get(user_id)
+        if self._queued_total >= AGENT_QUEUE_SIZE:
+            raise _rejection("queue_full", "Server is busy, please retry shortly", AGENT_QUEUE_TIMEOUT_SECONDS / 2)
+        if user_queue is not None and len(user_queue) >= AGENT_QUEUE_SIZE_PER_USER:
+            raise _rejection("user_queue_full", "Too many requests in progress for this user", 1)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued_total += 1
+        self._update_queue_gauge()
+        queued_at = time.monotonic()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), AGENT_QUEUE_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted at the last moment: give the slot back
+                self.release(user_id)
+            else:
+                waiter.cancel()
+                self._remove_waiter(user_id, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise _rejection("queue_timeout", "Timed out waiting for capacity", 1)
+        finally:
+            agent_queue_wait.observe(time.monotonic() - queued_at)
+
+    def _remove_waiter(self, user_id: str, waiter: asyncio.Future):
+        user_queue = self._queues.get(user_id)
+        if user_queue is None or waiter not in user_queue:
+            return
+        user_queue.remove(waiter)
+        self._queued_total -= 1
+        if not user_queue:
+            del self._queues[user_id]
+        self._update_queue_gauge()
+
+    def release(self, user_id: str):
+        self._active_total -= 1
+        remaining = self._active.get(user_id, 1) - 1
+        if remaining:
+            self._active[user_id] = remaining
+        else:
+            self._active.pop(user_id, None)
+        agent_active.set(self._active_total)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Hand free slots to waiting users in round-robin order."""
+        progressed = True
+        while progressed and self._queues and self._active_total < AGENT_MAX_CONCURRENT:
+            progressed = False
+            for user_id in list(self._queues):
+                if not self._can_run(user_id):
+                    continue
+                user_queue = self._queues.pop(user_id)
+                waiter = user_queue.popleft()
+                self._queued_total -= 1
+                if user_queue:
+                    # Back of the line for this user's next request
+                    self._queues[user_id] = user_queue
+                if waiter.done():
+                    progressed = True
+                    continue
+                self._grant(user_id)
+                waiter.set_result(None)
+                progressed = True
+                if self._active_total >= AGENT_MAX_CONCURRENT:
+                    break
+        self._update_queue_gauge()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str):
+        await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+
+agent_admission = AdmissionController()
@@ -1,19 +1,41 @@
 from fastapi import Depends,HTTPException
 from fastapi.security import OAuth2PasswordBearer,APIKeyHeader
 from passlib.context import CryptContext
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import hashlib
+import multiprocessing
+import secrets
+import time
 import jwt
 import os
 from dotenv import load_dotenv
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge, span
+from utils import password_hashing
 load_dotenv()
 
+logger = get_logger(__name__)
+
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Max number of verified access tokens kept in memory
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 API_KEY_NAME = "x-api-key"
 
+# bcrypt cost factor; if BCRYPT_TARGET_MS is set it is calibrated to that latency instead
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", "0"))
+# Processes dedicated to bcrypt, and how many hash/verify calls may wait for them
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
@@ -21,6 +43,27 @@ api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
+password_hash_queue_depth = Gauge(
+    "password_hash_queue_depth", "bcrypt calls running or waiting in the hashing pool",
+)
+password_hash_rejected = Counter(
+    "password_hash_rejected_total", "bcrypt calls rejected because the hashing queue was full",
+)
+token_cache_lookups = Counter(
+    "token_cache_lookups_total", "Access-token verifications by cache result", ("result",),
+)
+
+_hash_pool = None
+_hash_pending = 0
+_bcrypt_rounds = None
+# Calibration in progress; concurrent callers await the same one
+_bcrypt_calibration: Optional[asyncio.Future] = None
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash/verify calls are already queued."""
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -28,6 +71,96 @@ def hash_password(password):
     return pwd_context.hash(password)
 
 
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        # spawn: the pool starts inside the running app (warm-up or first login), and a
+        # forked child would inherit its event loop and any locks its threads hold
+        _hash_pool = ProcessPoolExecutor(
+            max_workers=BCRYPT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run_in_hash_pool(func, *args):
+    global _hash_pending
+    if _hash_pending >= BCRYPT_MAX_QUEUE:
+        password_hash_rejected.inc()
+        raise PasswordHasherBusy("Too many authentication requests in progress, retry shortly")
+
+    _hash_pending += 1
+    password_hash_queue_depth.set(_hash_pending)
+    try:
+        with span(f"bcrypt.{func.__name__}"):
+            return await asyncio.wrap_future(get_hash_pool().submit(func, *args))
+    finally:
+        _hash_pending -= 1
+        password_hash_queue_depth.set(_hash_pending)
+
+
+def calibrate_bcrypt_rounds() -> int:
+    """Settle the bcrypt cost in this process, blocking.
+
+    serve.py calls this in the gunicorn master before forking, so every
+    worker inherits the same cost instead of calibrating on its own.
+    """
+    global _bcrypt_rounds
+    if _bcrypt_rounds is None:
+        if BCRYPT_TARGET_MS:
+            _bcrypt_rounds = password_hashing.calibrate_rounds(BCRYPT_TARGET_MS)
+            logger.info("Calibrated bcrypt cost to %d rounds for a %.0fms target", _bcrypt_rounds, BCRYPT_TARGET_MS)
+        else:
+            _bcrypt_rounds = BCRYPT_ROUNDS
+    return _bcrypt_rounds
+
+
+async def _calibrate_in_pool() -> int:
+    global _bcrypt_rounds
+    rounds = await _run_in_hash_pool(password_hashing.calibrate_rounds, BCRYPT_TARGET_MS)
+    logger.info("Calibrated bcrypt cost to %d rounds for a %.0fms target", rounds, BCRYPT_TARGET_MS)
+    _bcrypt_rounds = rounds
+    return rounds
+
+
+async def get_bcrypt_rounds() -> int:
+    global _bcrypt_rounds, _bcrypt_calibration
+    if _bcrypt_rounds is not None:
+        return _bcrypt_rounds
+    if not BCRYPT_TARGET_MS:
+        _bcrypt_rounds = BCRYPT_ROUNDS
+        return _bcrypt_rounds
+    if _bcrypt_calibration is None:
+        _bcrypt_calibration = asyncio.ensure_future(_calibrate_in_pool())
+    try:
+        # shield: a cancelled login must not cancel the calibration others are waiting on
+        return await asyncio.shield(_bcrypt_calibration)
+    except Exception:
+        # Let the next caller try again
+        if _bcrypt_calibration is not None and _bcrypt_calibration.done():
+            _bcrypt_calibration = None
+        raise
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash in the dedicated bcrypt pool at the configured cost."""
+    return await _run_in_hash_pool(password_hashing.hash_password, password, await get_bcrypt_rounds())
+
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    """Verify in the bcrypt pool. Returns ``(is_valid, new_hash)`` where ``new_hash`` is
+    set when the stored hash used a lower cost and should be replaced."""
+    return await _run_in_hash_pool(
+        password_hashing.verify_and_rehash, plain_password, hashed_password, await get_bcrypt_rounds()
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     try: 
         to_encode = data.copy()
@@ -35,8 +168,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         to_encode.update({"exp": expire})
         return jwt.encode(to_encode,  SECRET_KEY , algorithm=ALGORITHM) # type: ignore
     except Exception as e:
-        print('An exception occurred')
-        print(e)
+        logger.exception("Failed to create access token: %s", e)
         return None
 
 def verify_access_token(token: str):
@@ -44,14 +176,13 @@ def verify_access_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) # type: ignore
         return payload
     except jwt.ExpiredSignatureError:
-        print('Token expired')
+        logger.debug("Token expired")
         return None
     except jwt.InvalidTokenError:
-        print('Invalid token')
+        logger.debug("Invalid token")
         return None
     except Exception as e:
-        print('An exception occurred')
-        print(e)
+        logger.exception("Failed to verify access token: %s", e)
         return None    
 
 def verify_token(token: str = Depends(oauth2_scheme)):
@@ -66,8 +197,7 @@ def verify_token(token: str = Depends(oauth2_scheme)):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
-        print('An exception occurred')
-        print(e)
+        logger.exception("Failed to verify token: %s", e)
         return HTTPException(status_code=401, detail="Invalid token")
     
 
@@ -80,21 +210,80 @@ def verify_api_key(api_key_header: str = Depends(api_key_header)):
         else:
             raise HTTPException(status_code=401, detail="Invalid API Key")
     except Exception as e:
-      print('An exception occurred',e)
+      logger.warning("API key check failed: %s", e)
       raise HTTPException(status_code=401, detail="Invalid API Key")
     
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# ------------------ Verified-token cache ------------------
+# token digest -> (user_id, exp as unix time); LRU-ordered
+_token_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _cached_user_id(digest: str) -> Optional[str]:
+    entry = _token_cache.get(digest)
+    if entry is None:
+        return None
+    user_id, exp = entry
+    if exp <= time.time():
+        _token_cache.pop(digest, None)
+        return None
+    _token_cache.move_to_end(digest)
+    return user_id
+
+
+def _cache_user_id(digest: str, user_id: str, exp: float):
+    _token_cache[digest] = (user_id, exp)
+    _token_cache.move_to_end(digest)
+    while len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    # async on purpose: a cache hit is a dict lookup, not worth a threadpool hop
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    digest = token_digest(token)
+    user_id = _cached_user_id(digest)
+    if user_id is not None:
+        token_cache_lookups.inc(result="hit")
+        return {"user_id": user_id}
+
+    token_cache_lookups.inc(result="miss")
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) # type: ignore
         user_id: str = payload.get("user_id")
         if user_id is None:
             raise credentials_exception
+        _cache_user_id(digest, user_id, payload["exp"])
         return {"user_id": user_id}
-    except jwt.PyJWTError:
+    except (jwt.PyJWTError, KeyError):
         raise credentials_exception
+
+
+# ------------------ Refresh tokens ------------------
+def create_refresh_token(refresh_tokens_collection, user_id: str) -> str:
+    """Issue an opaque refresh token; only its SHA-256 digest is stored."""
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    refresh_tokens_collection.insert_one({
+        "token_hash": token_digest(token),
+        "user_id": user_id,
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    })
+    return token
+
+
+def consume_refresh_token(refresh_tokens_collection, token: str) -> Optional[dict]:
+    """Atomically redeem a refresh token (rotation: each one works once)."""
+    record = refresh_tokens_collection.find_one_and_delete({"token_hash": token_digest(token)})
+    if record is None or record["expires_at"] <= datetime.utcnow():
+        return None
+    return record
     
\ No newline at end of file
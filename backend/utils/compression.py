@@ -0,0 +1,146 @@
+import asyncio
+import gzip
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from utils.metrics import Counter
+load_dotenv()
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Responses smaller than this (bytes) are sent as is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Low levels: most of the size win for a fraction of the CPU on dynamic JSON
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Bodies at least this large (bytes) are compressed in a worker thread, off the event loop
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(256 * 1024)))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+compression_bytes = Counter(
+    "http_compression_bytes_total",
+    "Response body bytes before (stage=in) and after (stage=out) compression",
+    ("encoding", "stage"),
+)
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """``"br;q=1.0, gzip;q=0.8, *;q=0"`` -> ``{"br": 1.0, "gzip": 0.8, "*": 0.0}``."""
+    weights = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+    return weights
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """Best encoding the client accepts, preferring brotli on ties."""
+    weights = parse_accept_encoding(header)
+    wildcard = weights.get("*", 0.0)
+    available = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Negotiated brotli/gzip for complete responses above ``COMPRESSION_MIN_SIZE``.
+
+    Only single-chunk bodies (regular JSON responses) are compressed. Streaming
+    responses such as SSE pass through untouched so events are not held back
+    by a compressor's buffer.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or not self._should_compress(start, body):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+            else:
+                compressed = compress(body, encoding)
+            compression_bytes.inc(len(body), encoding=encoding, stage="in")
+            compression_bytes.inc(len(compressed), encoding=encoding, stage="out")
+            headers = [(k, v) for k, v in start["headers"] if k not in (b"content-length", b"vary")]
+            vary = [v for k, v in start["headers"] if k == b"vary"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+        if start_message is not None:
+            # Response without a body message
+            await send(start_message)
+
+    def _should_compress(self, start: dict, body: bytes) -> bool:
+        if len(body) < self.minimum_size:
+            return False
+        content_type = b""
+        for name, value in start["headers"]:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        content_type_str = content_type.decode("latin-1").lower()
+        return content_type_str.startswith(COMPRESSIBLE_TYPES) and "text/event-stream" not in content_type_str
@@ -0,0 +1,269 @@
+"""Knowledge-base ingestion: text and PDF files into chunked documents.
+
+PDF pages are extracted in a process pool, a few pages per task, and streamed
+in order into the chunker, so only a bounded window of raw page text is held
+at any time. Lines repeated at the top or bottom of most pages of a PDF
+(running headers, footers, page numbers) are dropped, and chunks already seen
+in another file are skipped.
+"""
+import glob
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from collections import Counter as TallyCounter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from utils import pdf_pages
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Processes extracting PDF text; 1 extracts in this process
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Pages per pool task, and tasks in flight per worker (bounds memory held by extracted text)
+INGEST_BATCH_PAGES = int(os.getenv("INGEST_BATCH_PAGES", "8"))
+INGEST_PREFETCH_PER_WORKER = int(os.getenv("INGEST_PREFETCH_PER_WORKER", "2"))
+# Header/footer detection: leading pages sampled per PDF, edge lines examined per page,
+# and the share of sampled pages a line must appear on to count as boilerplate
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv("BOILERPLATE_SAMPLE_PAGES", "12"))
+BOILERPLATE_EDGE_LINES = int(os.getenv("BOILERPLATE_EDGE_LINES", "3"))
+BOILERPLATE_MIN_SHARE = float(os.getenv("BOILERPLATE_MIN_SHARE", "0.6"))
+# Plain-text files are chunked in sections of about this many characters
+TEXT_SECTION_CHARS = 64 * 1024
+
+TEXT_EXTENSIONS = (".txt", ".md")
+PDF_EXTENSIONS = (".pdf",)
+
+kb_pages_ingested = Counter("kb_pages_ingested_total", "Pages and text sections read into the knowledge base")
+kb_ingest_pages_per_second = Gauge("kb_ingest_pages_per_second", "Throughput of the last knowledge-base load")
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    pages: int = 0
+    chunks: int = 0
+    duplicate_chunks: int = 0
+    boilerplate_lines: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "pages_per_second": round(self.pages_per_second, 1)}
+
+
+def discover(paths: Iterable[str]) -> List[str]:
+    """Expand files, directories (recursively) and glob patterns into supported files."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = sorted(glob.glob(os.path.join(path, "**", "*"), recursive=True))
+        elif glob.has_magic(path):
+            candidates = sorted(glob.glob(path, recursive=True))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if candidate.lower().endswith(TEXT_EXTENSIONS + PDF_EXTENSIONS) and candidate not in found:
+                found.append(candidate)
+    return found
+
+
+def _normalize_line(line: str) -> str:
+    # "Page 3 of 120" and "Page 4 of 120" are the same footer
+    return re.sub(r"\d+", "#", " ".join(line.split()).lower())
+
+
+class BoilerplateFilter:
+    """Drops lines repeated at the edges of most pages of one document.
+
+    The first ``BOILERPLATE_SAMPLE_PAGES`` pages are held back to learn which
+    edge lines repeat; after that, pages pass straight through.
+    """
+
+    def __init__(self, sample_pages: int = BOILERPLATE_SAMPLE_PAGES):
+        self.sample_pages = sample_pages
+        self.sample: List[Tuple[int, str]] = []
+        self.boilerplate: Optional[set] = None
+        self.removed = 0
+
+    @staticmethod
+    def _edge_lines(text: str) -> set:
+        lines = [line for line in text.splitlines() if line.strip()]
+        edges = lines[:BOILERPLATE_EDGE_LINES] + lines[-BOILERPLATE_EDGE_LINES:]
+        return {_normalize_line(line) for line in edges}
+
+    def _learn(self):
+        tally = TallyCounter()
+        for _, text in self.sample:
+            tally.update(self._edge_lines(text))
+        threshold = max(2, BOILERPLATE_MIN_SHARE * len(self.sample))
+        self.boilerplate = {line for line, count in tally.items() if count >= threshold} if len(self.sample) >= 3 else set()
+
+    def _clean(self, text: str) -> str:
+        if not self.boilerplate:
+            return text
+        lines = text.splitlines()
+        # Only edge lines are candidates: the same sentence in the body is content
+        non_blank = [index for index, line in enumerate(lines) if line.strip()]
+        edge = set(non_blank[:BOILERPLATE_EDGE_LINES] + non_blank[-BOILERPLATE_EDGE_LINES:])
+        kept = []
+        for index, line in enumerate(lines):
+            if index in edge and _normalize_line(line) in self.boilerplate:
+                self.removed += 1
+                continue
+            kept.append(line)
+        return "\n".join(kept)
+
+    def feed(self, page_number: int, text: str) -> Iterator[Tuple[int, str]]:
+        if self.boilerplate is None:
+            self.sample.append((page_number, text))
+            if len(self.sample) < self.sample_pages:
+                return
+            self._learn()
+            yield from self._drain()
+            return
+        yield page_number, self._clean(text)
+
+    def finish(self) -> Iterator[Tuple[int, str]]:
+        if self.boilerplate is None:
+            self._learn()
+        yield from self._drain()
+
+    def _drain(self) -> Iterator[Tuple[int, str]]:
+        sample, self.sample = self.sample, []
+        for page_number, text in sample:
+            yield page_number, self._clean(text)
+
+
+def iter_text_sections(path: str) -> Iterator[Tuple[int, str]]:
+    """A text file in paragraph-aligned sections, without reading it whole."""
+    section, size, number = [], 0, 1
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            section.append(line)
+            size += len(line)
+            if size >= TEXT_SECTION_CHARS and not line.strip():
+                yield number, "".join(section)
+                section, size, number = [], 0, number + 1
+    if section:
+        yield number, "".join(section)
+
+
+def iter_pdf_pages(pdf_files: List[str], pool: Optional[ProcessPoolExecutor] = None,
+                   workers: int = 1) -> Iterator[Tuple[str, int, str]]:
+    """``(path, page_number, text)`` for every page, in order, extracted by ``pool`` if given."""
+    if pool is None:
+        for path in pdf_files:
+            count = pdf_pages.page_count(path)
+            if not count:
+                logger.warning("Skipping %s: no readable pages", path)
+            for start in range(0, count, INGEST_BATCH_PAGES):
+                for page_number, text in pdf_pages.extract_pages(path, start, start + INGEST_BATCH_PAGES):
+                    yield path, page_number, text
+        return
+
+    counts = dict(zip(pdf_files, pool.map(pdf_pages.page_count, pdf_files)))
+    for path, count in counts.items():
+        if not count:
+            logger.warning("Skipping %s: no readable pages", path)
+    tasks = ((path, start) for path in pdf_files for start in range(0, counts[path], INGEST_BATCH_PAGES))
+    in_flight = deque()
+    max_in_flight = max(1, workers * INGEST_PREFETCH_PER_WORKER)
+
+    def submit_next() -> bool:
+        task = next(tasks, None)
+        if task is None:
+            return False
+        path, start = task
+        in_flight.append((path, pool.submit(pdf_pages.extract_pages, path, start, start + INGEST_BATCH_PAGES)))
+        return True
+
+    while len(in_flight) < max_in_flight and submit_next():
+        pass
+    while in_flight:
+        path, future = in_flight.popleft()
+        submit_next()
+        for page_number, text in future.result():
+            yield path, page_number, text
+
+
+def _hash_chunk(text: str) -> str:
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def ingest(paths: Iterable[str], chunk_size: int = 500, chunk_overlap: int = 100,
+           workers: int = INGEST_WORKERS) -> Tuple[list, IngestionStats]:
+    """Chunk every supported file under ``paths``. Returns ``(documents, stats)``."""
+    from langchain.text_splitter import CharacterTextSplitter, RecursiveCharacterTextSplitter
+    from langchain_core.documents import Document
+
+    started = time.perf_counter()
+    text_splitter = CharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    # Extracted PDF text rarely has blank lines between paragraphs; fall back to lines and words
+    pdf_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    files = discover(paths)
+    stats = IngestionStats(files=len(files))
+    documents, seen = [], set()
+
+    def add_page(path: str, page_number: int, text: str, splitter=pdf_splitter):
+        stats.pages += 1
+        for chunk in splitter.split_text(text):
+            digest = _hash_chunk(chunk)
+            if digest in seen:
+                stats.duplicate_chunks += 1
+                continue
+            seen.add(digest)
+            documents.append(Document(page_content=chunk, metadata={"source": path, "page": page_number}))
+
+    for path in files:
+        if path.lower().endswith(TEXT_EXTENSIONS):
+            for number, text in iter_text_sections(path):
+                add_page(path, number, text, text_splitter)
+
+    pdf_files = [path for path in files if path.lower().endswith(PDF_EXTENSIONS)]
+    pool = None
+    if pdf_files and workers > 1:
+        # spawn: the knowledge base loads from a warm-up thread while the app serves
+        # requests; a fork would copy that half-running state into every worker
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        current_path, page_filter = None, None
+        for path, page_number, text in iter_pdf_pages(pdf_files, pool, workers):
+            if path != current_path:
+                if page_filter is not None:
+                    for number, cleaned in page_filter.finish():
+                        add_page(current_path, number, cleaned)
+                    stats.boilerplate_lines += page_filter.removed
+                current_path, page_filter = path, BoilerplateFilter()
+            for number, cleaned in page_filter.feed(page_number, text):
+                add_page(path, number, cleaned)
+        if page_filter is not None:
+            for number, cleaned in page_filter.finish():
+                add_page(current_path, number, cleaned)
+            stats.boilerplate_lines += page_filter.removed
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    stats.chunks = len(documents)
+    stats.seconds = time.perf_counter() - started
+    kb_pages_ingested.inc(stats.pages)
+    kb_ingest_pages_per_second.set(stats.pages_per_second)
+    logger.info(
+        "Knowledge base: %d files, %d pages, %d chunks (%d duplicate chunks, %d boilerplate lines dropped) "
+        "in %.2fs, %.1f pages/s",
+        stats.files, stats.pages, stats.chunks, stats.duplicate_chunks, stats.boilerplate_lines,
+        stats.seconds, stats.pages_per_second,
+    )
+    return documents, stats
@@ -0,0 +1,36 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+# Keys such as department names are always strings, but be lenient like json.dumps
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any):
+    """Types orjson does not know natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def json_dumps(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON. datetimes become ISO 8601, ObjectIds strings."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """The app's default response class: orjson, with ObjectId and datetime support.
+
+    Returning an instance directly from a route also skips FastAPI's
+    ``jsonable_encoder`` pass, which dominates the cost of large lists.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
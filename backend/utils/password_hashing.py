@@ -0,0 +1,39 @@
+"""bcrypt work that runs inside the password-hashing process pool.
+
+Kept free of FastAPI/app imports so pool processes start quickly.
+"""
+import time
+
+from passlib.hash import bcrypt
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def verify_and_rehash(password: str, hashed_password: str, rounds: int):
+    """Verify a password; if it is valid but was hashed with a lower cost,
+    also return a fresh hash at ``rounds`` so the caller can store it.
+
+    Only upgrades: hosts that calibrated to different costs must not rewrite
+    the same user's hash back and forth on every login."""
+    if not bcrypt.verify(password, hashed_password):
+        return False, None
+    if bcrypt.from_string(hashed_password).rounds < rounds:
+        return True, hash_password(password, rounds)
+    return True, None
+
+
+def calibrate_rounds(target_ms: float) -> int:
+    """Highest cost factor whose hash takes no longer than ``target_ms`` on this machine."""
+    rounds = MIN_ROUNDS
+    while rounds < MAX_ROUNDS:
+        start = time.perf_counter()
+        hash_password("calibration-password", rounds + 1)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
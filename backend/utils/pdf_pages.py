@@ -0,0 +1,31 @@
+"""PDF text extraction that runs inside the ingestion process pool.
+
+Tasks take a file path and a page range and return plain ``(page, text)``
+tuples, so nothing heavier than a string crosses the process boundary. The
+only import is pypdf, which is all a freshly spawned worker has to load.
+"""
+from typing import List, Tuple
+
+from pypdf import PdfReader
+
+
+def page_count(path: str) -> int:
+    """Number of pages, or 0 if the file cannot be parsed as a PDF."""
+    try:
+        return len(PdfReader(path).pages)
+    except Exception:
+        return 0
+
+
+def extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Text of pages ``start``..``stop - 1`` as ``(page_number, text)``, 1-based."""
+    reader = PdfReader(path)
+    pages = []
+    for index in range(start, min(stop, len(reader.pages))):
+        try:
+            text = reader.pages[index].extract_text() or ""
+        except Exception:
+            # One malformed page must not cost the rest of the document
+            text = ""
+        pages.append((index + 1, text))
+    return pages
@@ -0,0 +1,113 @@
+"""Single-flight coalescing: concurrent identical calls share one execution.
+
+    students_flight = SingleFlight("students")
+    result = await students_flight.do("all", asyncio.to_thread, fetch_students_data)
+
+The first caller for a key starts the call as its own task; callers that
+arrive with the same key while it runs await that task instead of starting
+another. Nothing is cached: once the call finishes, the next caller starts a
+fresh one. All callers receive the same result object, so they must not
+mutate it.
+
+Followers per call are capped (``SINGLEFLIGHT_MAX_WAITERS``); callers beyond
+the cap run the call themselves. Each caller waits at most
+``SINGLEFLIGHT_TIMEOUT_SECONDS`` and then gets ``SingleFlightTimeout``. The
+shared call is not cancelled when a caller gives up or disconnects, so the
+callers still waiting get its result.
+"""
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from dotenv import load_dotenv
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Callers that may wait on one in-flight call, and how long each may wait
+SINGLEFLIGHT_MAX_WAITERS = int(os.getenv("SINGLEFLIGHT_MAX_WAITERS", "256"))
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SECONDS", "30"))
+
+singleflight_calls = Counter(
+    "singleflight_calls_total",
+    "Calls through a single-flight group: leader (ran it), coalesced (shared it), overflow (too many waiters)",
+    ("group", "role"),
+)
+singleflight_timeouts = Counter(
+    "singleflight_timeouts_total", "Callers that gave up waiting for a shared call", ("group",),
+)
+singleflight_coalesced_ratio = Gauge(
+    "singleflight_coalesced_ratio", "Share of calls since start that reused an in-flight call", ("group",),
+)
+
+
+class SingleFlightTimeout(asyncio.TimeoutError):
+    """The shared call did not finish within the caller's timeout."""
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, group: str, max_waiters: int = SINGLEFLIGHT_MAX_WAITERS,
+                 timeout: float = SINGLEFLIGHT_TIMEOUT_SECONDS):
+        self.group = group
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._total = 0
+        self._coalesced = 0
+
+    def _count(self, role: str):
+        self._total += 1
+        if role == "coalesced":
+            self._coalesced += 1
+        singleflight_calls.inc(group=self.group, role=role)
+        singleflight_coalesced_ratio.set(self._coalesced / self._total, group=self.group)
+
+    def _start(self, key: Hashable, fn: Callable[..., Awaitable[Any]], args, kwargs) -> _Call:
+        # The shared call runs in the leader's context (e.g. its usage scope)
+        call = _Call(asyncio.ensure_future(fn(*args, **kwargs)))
+
+        def finished(task: asyncio.Task):
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            if not task.cancelled() and task.exception() is not None and not call.waiters:
+                # Every caller timed out; log rather than leave the error unretrieved
+                logger.warning("Single-flight %s call %r failed after its callers left: %s",
+                               self.group, key, task.exception())
+
+        call.task.add_done_callback(finished)
+        self._calls[key] = call
+        return call
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """``await fn(*args, **kwargs)``, shared with concurrent callers using the same ``key``."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._start(key, fn, args, kwargs)
+            self._count("leader")
+        elif call.waiters >= self.max_waiters:
+            self._count("overflow")
+            return await fn(*args, **kwargs)
+        else:
+            self._count("coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), self.timeout)
+        except asyncio.TimeoutError:
+            singleflight_timeouts.inc(group=self.group)
+            raise SingleFlightTimeout(f"{self.group} call did not finish within {self.timeout:g}s") from None
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        return len(self._calls)
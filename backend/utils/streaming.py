@@ -0,0 +1,22 @@
+from typing import Callable
+
+from fastapi.responses import StreamingResponse
+
+
+class GuardedStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs ``on_close`` once the response is over, however it ended.
+
+    Cleanup in the body generator's ``finally`` is not enough: the generator
+    never starts if the client is gone before the response headers are sent,
+    so its ``finally`` never runs.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
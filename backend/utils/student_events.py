@@ -0,0 +1,279 @@
+"""Live student roster changes for connected dashboards.
+
+Changes are read from MongoDB rather than published by the code that makes
+them, so writes from any worker process (or from outside the app) reach every
+dashboard. Each process runs one watcher while it has subscribers:
+
+- ``change_stream``: a MongoDB change stream (replica sets and sharded clusters)
+- ``poll``: for standalone servers (see below)
+
+``STUDENT_EVENTS_SOURCE=auto`` tries the change stream and falls back to
+polling. Events are keyed by the document ``_id`` (a string, as in the
+``/students`` rows), which delete events carry without a pre-image.
+
+Polling cost, per worker with subscribers: every ``STUDENT_EVENTS_POLL_SECONDS``
+one indexed query for students whose ``updated_at`` (set by the app's writes)
+moved, plus the collection's metadata count. Only when the count disagrees
+with the last snapshot are the ``_id``s read (index only) to find deletes and
+inserts. Writes made outside the app that leave ``updated_at`` alone are
+caught by a full re-read every ``STUDENT_EVENTS_FULL_SCAN_SECONDS``.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+from utils.logger import get_logger
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Max number of distinct students a single connection may have pending before
+# we give up on diffs and ask that dashboard to re-fetch the roster.
+MAX_PENDING_PER_CONNECTION = 500
+# Where changes come from: auto, change_stream or poll
+STUDENT_EVENTS_SOURCE = os.getenv("STUDENT_EVENTS_SOURCE", "auto")
+# Poll watcher: seconds between checks for changed students, and between full re-reads
+STUDENT_EVENTS_POLL_SECONDS = float(os.getenv("STUDENT_EVENTS_POLL_SECONDS", "2"))
+STUDENT_EVENTS_FULL_SCAN_SECONDS = float(os.getenv("STUDENT_EVENTS_FULL_SCAN_SECONDS", "60"))
+# updated_at comes from each writer's clock and commits can land late: re-read this far back
+STUDENT_EVENTS_POLL_OVERLAP_SECONDS = 5.0
+# Pause before a failed watcher is restarted
+STUDENT_EVENTS_RETRY_SECONDS = 1.0
+
+
+class StudentSubscription:
+    """Pending student changes for one connected dashboard.
+
+    Changes are coalesced per student ``_id``, so a slow client only ever holds
+    the latest state of each student instead of an unbounded backlog.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING_PER_CONNECTION):
+        self.max_pending = max_pending
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._resync = False
+        self._ready = asyncio.Event()
+
+    def push(self, event: Dict[str, Any]):
+        key = event["id"]
+        previous = self._pending.get(key)
+
+        if previous is not None:
+            if previous["op"] == "insert" and event["op"] == "delete":
+                # Inserted and removed before the client saw it
+                del self._pending[key]
+                return
+            if previous["op"] == "insert" and event["op"] == "update":
+                event = {**event, "op": "insert"}
+            if previous["op"] == "delete" and event["op"] == "insert":
+                event = {**event, "op": "update"}
+
+        self._pending[key] = event
+        if len(self._pending) > self.max_pending:
+            self.resync()
+            return
+        self._ready.set()
+
+    def resync(self):
+        """Drop pending diffs and tell the client to re-fetch the roster."""
+        self._pending.clear()
+        self._resync = True
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait for pending changes; returns None if nothing arrived in time."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        self._ready.clear()
+        if self._resync:
+            self._resync = False
+            self._pending.clear()
+            return {"type": "resync"}
+
+        events = list(self._pending.values())
+        self._pending.clear()
+        return {"type": "diff", "events": events}
+
+
+def _stringify_id(document: Dict[str, Any]) -> Dict[str, Any]:
+    return {**document, "_id": str(document["_id"])}
+
+
+class StudentEventBroker:
+    """Fans student inserts/updates/deletes out to every connected dashboard."""
+
+    def __init__(self, source: str = STUDENT_EVENTS_SOURCE):
+        self.source = source
+        self._subscriptions: List[StudentSubscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._watcher: Optional[asyncio.Task] = None
+        self._primed: Optional[asyncio.Event] = None
+
+    async def subscribe(self) -> StudentSubscription:
+        """Register a dashboard; returns once changes from now on will be delivered."""
+        self._loop = asyncio.get_running_loop()
+        subscription = StudentSubscription()
+        with self._lock:
+            self._subscriptions.append(subscription)
+        if self._watcher is None or self._watcher.done():
+            self._primed = asyncio.Event()
+            self._watcher = asyncio.create_task(self._watch(self._primed))
+        await self._primed.wait()
+        return subscription
+
+    def unsubscribe(self, subscription: StudentSubscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, op: str, student_id: Any, student: Optional[Dict[str, Any]] = None):
+        """Queue a change for all subscribers. Safe to call from any thread."""
+        if not self._subscriptions or self._loop is None:
+            return
+
+        event: Dict[str, Any] = {"op": op, "id": student_id}
+        if student is not None:
+            event["student"] = student
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            self._dispatch(event)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Dict[str, Any]):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    def _resync_all(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.resync()
+
+    async def close(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    # ------------------ Watchers ------------------
+    async def _watch(self, primed: asyncio.Event):
+        """Run while anyone is subscribed; a dashboard that connects later re-fetches anyway."""
+        source = self.source
+        try:
+            while self._subscriptions:
+                try:
+                    if source == "poll":
+                        await self._watch_poll(primed)
+                    else:
+                        await self._watch_change_stream(primed)
+                except Exception as e:
+                    if source == "auto" and not primed.is_set():
+                        logger.info("Student change stream unavailable (%s); polling instead", e)
+                        source = "poll"
+                        continue
+                    logger.warning("Student watcher failed, restarting: %s", e)
+                    # Don't hold up new subscribers, and resync those who may have missed changes
+                    primed.set()
+                    self._resync_all()
+                    await asyncio.sleep(STUDENT_EVENTS_RETRY_SECONDS)
+        finally:
+            primed.set()
+
+    async def _watch_change_stream(self, primed: asyncio.Event):
+        from config.database import get_async_db
+
+        collection = get_async_db()["students"]
+        async with await collection.watch(full_document="updateLookup", max_await_time_ms=1000) as stream:
+            primed.set()
+            while self._subscriptions:
+                change = await stream.try_next()
+                if change is None:
+                    continue
+                operation = change["operationType"]
+                if operation == "delete":
+                    self.publish("delete", str(change["documentKey"]["_id"]))
+                elif operation in ("insert", "update", "replace") and change.get("fullDocument"):
+                    # fullDocument is missing when the student was deleted before the lookup
+                    student = _stringify_id(change["fullDocument"])
+                    self.publish("insert" if operation == "insert" else "update", student["_id"], student)
+                elif operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                    self._resync_all()
+                    return
+
+    async def _watch_poll(self, primed: asyncio.Event):
+        from bson import ObjectId
+        from config.database import get_db, string_id_stages
+
+        collection = get_db()["students"]
+
+        def read(match: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+            rows = collection.aggregate([{"$match": match}, *string_id_stages()])
+            return {row["_id"]: row for row in rows}
+
+        def check(since: datetime) -> Tuple[Dict[str, Dict[str, Any]], Optional[Set[str]]]:
+            changed = read({"updated_at": {"$gte": since}})
+            ids = None
+            if collection.estimated_document_count() != len(known.keys() | changed.keys()):
+                ids = {str(row["_id"]) for row in collection.find({}, {"_id": 1})}
+                missing = ids - known.keys() - changed.keys()
+                if missing:
+                    # Inserted without updated_at (outside the app)
+                    changed.update(read({"_id": {"$in": [ObjectId(_id) for _id in missing]}}))
+            return changed, ids
+
+        def diff(changed: Dict[str, Dict[str, Any]]):
+            for _id, student in changed.items():
+                before = known.get(_id)
+                if before is None:
+                    self.publish("insert", _id, student)
+                elif before != student:
+                    self.publish("update", _id, student)
+                known[_id] = student
+
+        def drop(gone: Set[str]):
+            for _id in gone:
+                del known[_id]
+                self.publish("delete", _id)
+
+        known: Dict[str, Dict[str, Any]] = await asyncio.to_thread(read, {})
+        watermark = datetime.utcnow()
+        full_scan_at = time.monotonic()
+        primed.set()
+        while self._subscriptions:
+            await asyncio.sleep(STUDENT_EVENTS_POLL_SECONDS)
+            started = datetime.utcnow()
+            if time.monotonic() - full_scan_at >= STUDENT_EVENTS_FULL_SCAN_SECONDS:
+                current = await asyncio.to_thread(read, {})
+                full_scan_at = time.monotonic()
+                drop(known.keys() - current.keys())
+                diff(current)
+            else:
+                since = watermark - timedelta(seconds=STUDENT_EVENTS_POLL_OVERLAP_SECONDS)
+                changed, ids = await asyncio.to_thread(check, since)
+                diff(changed)
+                if ids is not None:
+                    drop(known.keys() - ids)
+            watermark = started
+
+
+student_events = StudentEventBroker()
@@ -0,0 +1,296 @@
+"""In-process queue for work that should not hold up a response.
+
+    @task_queue.task("update_thread_stats")
+    def update_thread_stats_job(...): ...
+
+    task_queue.enqueue("update_thread_stats", thread_id=...)
+
+Jobs run on ``TASK_QUEUE_CONCURRENCY`` worker coroutines; synchronous handlers
+run in a thread. A failing job is retried in process with exponential backoff
+and jitter. When retries run out, the in-memory queue is full, or the process
+shuts down with work left, the job is written to the ``jobs`` collection. A
+poller in every process claims due jobs from there with a lease, so the work
+survives restarts. Handlers must be idempotent, and their arguments must be
+storable in MongoDB.
+"""
+import asyncio
+import contextvars
+import inspect
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from utils.logger import get_logger
+from utils.metrics import Counter, Gauge, Histogram
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Jobs running at once, and jobs waiting in memory before they spill to MongoDB
+TASK_QUEUE_CONCURRENCY = int(os.getenv("TASK_QUEUE_CONCURRENCY", "4"))
+TASK_QUEUE_MAX_SIZE = int(os.getenv("TASK_QUEUE_MAX_SIZE", "1000"))
+# In-process attempts per job, and the backoff between them
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "3"))
+TASK_RETRY_BASE_SECONDS = float(os.getenv("TASK_RETRY_BASE_SECONDS", "0.5"))
+TASK_RETRY_MAX_SECONDS = float(os.getenv("TASK_RETRY_MAX_SECONDS", "300"))
+# Durable jobs: total attempts before a job is marked dead, poll interval and claim lease
+TASK_DURABLE_MAX_ATTEMPTS = int(os.getenv("TASK_DURABLE_MAX_ATTEMPTS", "10"))
+TASK_QUEUE_POLL_SECONDS = float(os.getenv("TASK_QUEUE_POLL_SECONDS", "10"))
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "120"))
+# On shutdown, how long to let queued jobs finish before persisting the rest
+TASK_QUEUE_DRAIN_SECONDS = float(os.getenv("TASK_QUEUE_DRAIN_SECONDS", "5"))
+
+task_queue_depth = Gauge("task_queue_depth", "Background jobs waiting in memory")
+task_queue_lag = Histogram(
+    "task_queue_lag_seconds", "Time from a job becoming runnable to a worker starting it", ("task",),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 120.0),
+)
+task_duration = Histogram("task_duration_seconds", "Background job run time", ("task",))
+task_outcomes = Counter(
+    "task_queue_jobs_total", "Background job attempts by outcome (ok, retried, persisted, dead)", ("task", "outcome"),
+)
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(TASK_RETRY_MAX_SECONDS, TASK_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def get_jobs_collection():
+    from config.database import get_db
+
+    return get_db()["jobs"]
+
+
+@dataclass(eq=False)
+class Job:
+    name: str
+    kwargs: Dict[str, Any]
+    attempts: int = 0
+    durable_id: Any = None  # _id in the jobs collection, for jobs claimed from there
+    ready_at: float = field(default_factory=time.monotonic)
+
+
+class TaskQueue:
+    def __init__(self):
+        self._handlers: Dict[str, Callable] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._poller: Optional[asyncio.Task] = None
+        self._retries: Dict[Job, asyncio.TimerHandle] = {}
+        self._running = set()
+        self._background = set()
+
+    def task(self, name: str):
+        """Register the handler for jobs called ``name``."""
+        def decorator(fn):
+            self._handlers[name] = fn
+            return fn
+        return decorator
+
+    # ------------------ Lifecycle ------------------
+    @staticmethod
+    def _create_task(coro) -> asyncio.Task:
+        # A fresh context, so long-lived tasks don't log and trace under the
+        # request id, spans and usage scope of whoever happened to start them
+        return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=TASK_QUEUE_MAX_SIZE)
+            self._workers = [self._create_task(self._worker()) for _ in range(TASK_QUEUE_CONCURRENCY)]
+
+    async def start(self):
+        """Start the workers and the poller for durable jobs. Called from the app lifespan."""
+        self._ensure_started()
+        if self._poller is None:
+            self._poller = self._create_task(self._poll_loop())
+
+    async def stop(self):
+        """Let queued jobs finish for up to ``TASK_QUEUE_DRAIN_SECONDS``, then persist what is left."""
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), TASK_QUEUE_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        # Jobs cut off mid-run are persisted too; handlers are idempotent
+        leftover = list(self._running) + list(self._retries)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        self._queue, self._workers = None, []
+        task_queue_depth.set(0)
+
+        if leftover:
+            logger.warning("Persisting %d unfinished background jobs", len(leftover))
+            await asyncio.gather(*(self._persist(job, "shutdown") for job in leftover))
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    # ------------------ Enqueueing ------------------
+    def enqueue(self, name: str, **kwargs):
+        """Queue a job; never blocks. Must be called from the event loop."""
+        if name not in self._handlers:
+            raise KeyError(f"No background task registered as {name!r}")
+        self._ensure_started()
+        self._put(Job(name, kwargs))
+
+    def _put(self, job: Job) -> bool:
+        job.ready_at = time.monotonic()
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._spawn(self._persist(job, "queue full"))
+            return False
+        task_queue_depth.set(self._queue.qsize())
+        return True
+
+    def _spawn(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _retry_later(self, job: Job, delay: float):
+        def requeue():
+            self._retries.pop(job, None)
+            if self._queue is not None:
+                self._put(job)
+        self._retries[job] = asyncio.get_running_loop().call_later(delay, requeue)
+
+    # ------------------ Running ------------------
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            task_queue_depth.set(self._queue.qsize())
+            self._running.add(job)
+            try:
+                await self._run(job)
+            except Exception as e:  # bookkeeping failed; the job itself was handled
+                logger.exception("Background queue error on %s: %s", job.name, e)
+            finally:
+                self._running.discard(job)
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        task_queue_lag.observe(time.monotonic() - job.ready_at, task=job.name)
+        handler = self._handlers.get(job.name)
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"No background task registered as {job.name!r}")
+            if inspect.iscoroutinefunction(handler):
+                await handler(**job.kwargs)
+            else:
+                await asyncio.to_thread(handler, **job.kwargs)
+        except Exception as e:
+            job.attempts += 1
+            await self._failed(job, e)
+            return
+        finally:
+            task_duration.observe(time.perf_counter() - started, task=job.name)
+
+        task_outcomes.inc(task=job.name, outcome="ok")
+        if job.durable_id is not None:
+            await asyncio.to_thread(get_jobs_collection().delete_one, {"_id": job.durable_id})
+
+    async def _failed(self, job: Job, error: Exception):
+        if job.durable_id is not None:
+            await self._reschedule_durable(job, error)
+        elif job.attempts < TASK_MAX_ATTEMPTS:
+            task_outcomes.inc(task=job.name, outcome="retried")
+            logger.warning("Background job %s failed (attempt %d), retrying: %s", job.name, job.attempts, error)
+            self._retry_later(job, backoff(job.attempts))
+        else:
+            await self._persist(job, repr(error))
+
+    # ------------------ Durable fallback ------------------
+    async def _persist(self, job: Job, reason: str):
+        """Hand a job to the jobs collection for a later (or another process's) attempt."""
+        if job.durable_id is not None:
+            # Already stored: release the claim so the poller can pick it up again
+            await asyncio.to_thread(
+                get_jobs_collection().update_one,
+                {"_id": job.durable_id},
+                {"$set": {"status": "pending", "run_at": datetime.utcnow(), "locked_until": None}},
+            )
+            return
+        document = {
+            "name": job.name,
+            "kwargs": job.kwargs,
+            "attempts": job.attempts,
+            "status": "pending",
+            "run_at": datetime.utcnow() + timedelta(seconds=backoff(job.attempts)),
+            "locked_until": None,
+            "last_error": reason,
+            "created_at": datetime.utcnow(),
+        }
+        try:
+            await asyncio.to_thread(get_jobs_collection().insert_one, document)
+            task_outcomes.inc(task=job.name, outcome="persisted")
+        except Exception as e:
+            task_outcomes.inc(task=job.name, outcome="dead")
+            logger.error("Lost background job %s %s (%s); could not persist it: %s", job.name, job.kwargs, reason, e)
+
+    async def _reschedule_durable(self, job: Job, error: Exception):
+        if job.attempts >= TASK_DURABLE_MAX_ATTEMPTS:
+            update = {"status": "dead", "locked_until": None, "last_error": repr(error), "attempts": job.attempts}
+            task_outcomes.inc(task=job.name, outcome="dead")
+            logger.error("Background job %s gave up after %d attempts: %s", job.name, job.attempts, error)
+        else:
+            update = {
+                "status": "pending",
+                "locked_until": None,
+                "last_error": repr(error),
+                "attempts": job.attempts,
+                "run_at": datetime.utcnow() + timedelta(seconds=backoff(job.attempts)),
+            }
+            task_outcomes.inc(task=job.name, outcome="retried")
+        await asyncio.to_thread(get_jobs_collection().update_one, {"_id": job.durable_id}, {"$set": update})
+
+    def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return get_jobs_collection().find_one_and_update(
+            {"$or": [
+                {"status": "pending", "run_at": {"$lte": now}},
+                # Claimed by a process that died or stalled
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {"status": "running", "locked_until": now + timedelta(seconds=TASK_LEASE_SECONDS)}},
+            sort=[("run_at", 1)],
+        )
+
+    async def poll_once(self) -> int:
+        """Move due durable jobs into the in-memory queue while it has room."""
+        claimed = 0
+        while self._queue is not None and self._queue.qsize() < TASK_QUEUE_MAX_SIZE // 2:
+            document = await asyncio.to_thread(self._claim)
+            if document is None:
+                break
+            self._put(Job(document["name"], document.get("kwargs") or {}, document.get("attempts", 0), document["_id"]))
+            claimed += 1
+        return claimed
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.warning("Polling the jobs collection failed: %s", e)
+            await asyncio.sleep(TASK_QUEUE_POLL_SECONDS)
+
+
+task_queue = TaskQueue()
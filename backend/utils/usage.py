@@ -0,0 +1,253 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from utils.logger import get_logger
+from utils.metrics import Counter
+load_dotenv()
+
+logger = get_logger(__name__)
+
+# Per-user daily limits (UTC days); 0 disables a limit
+USAGE_DAILY_TOKEN_BUDGET = int(os.getenv("USAGE_DAILY_TOKEN_BUDGET", "0"))
+USAGE_DAILY_COST_BUDGET_USD = float(os.getenv("USAGE_DAILY_COST_BUDGET_USD", "0"))
+# How often buffered usage is written to MongoDB, and how long a user's stored daily total is trusted
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+USAGE_TOTALS_CACHE_SECONDS = float(os.getenv("USAGE_TOTALS_CACHE_SECONDS", "30"))
+
+# USD per million (prompt, completion) tokens. Override or extend with
+# LLM_PRICES="gemini-2.5-flash=0.30/2.50,llama-3.3-70b-versatile=0.59/0.79"
+DEFAULT_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "gpt-4o-mini": (0.15, 0.60),
+    "stub-model": (0.0, 0.0),
+}
+
+llm_tokens = Counter(
+    "llm_tokens_total", "LLM tokens by source, model and kind (prompt/completion)", ("source", "model", "kind"),
+)
+usage_budget_rejected = Counter(
+    "usage_budget_rejected_total", "Agent requests refused because the user's daily budget is spent",
+)
+
+# Who the current LLM calls are billed to; set by the chat routes around an agent run
+usage_context: ContextVar[Optional[dict]] = ContextVar("usage_context", default=None)
+
+
+def _parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            model, _, rates = entry.partition("=")
+            prompt_rate, _, completion_rate = rates.partition("/")
+            prices[model.strip()] = (float(prompt_rate), float(completion_rate))
+        except ValueError:
+            logger.error("Ignoring malformed LLM_PRICES entry %r", entry)
+    return prices
+
+
+PRICES = _parse_prices(os.getenv("LLM_PRICES", ""))
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_rate, completion_rate = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_rate + completion_tokens * completion_rate) / 1_000_000
+
+
+def utc_day() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def seconds_until_utc_midnight() -> float:
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+@contextmanager
+def usage_scope(user_id: str, thread_id: Optional[str]):
+    """Bill LLM calls made inside this block (including tool calls) to the user and thread."""
+    token = usage_context.set({"user_id": user_id, "thread_id": thread_id})
+    try:
+        yield
+    finally:
+        usage_context.reset(token)
+
+
+def get_usage_collection():
+    from config.database import get_db
+
+    return get_db()["usage"]
+
+
+class UsageRecorder:
+    """Buffers token usage in memory and folds it into the ``usage`` collection.
+
+    ``record`` is cheap and never touches the database: it is called on the
+    request path for every LLM call. A background task upserts the aggregated
+    counters every ``USAGE_FLUSH_SECONDS``. Documents are keyed by user, UTC
+    day, thread, source (``agent`` or a tool name) and model. All state is
+    touched from the event loop only.
+    """
+
+    def __init__(self):
+        # (user_id, day, thread_id, source, model) -> counters
+        self._pending: Dict[tuple, Dict[str, float]] = {}
+        # Batches taken from _pending whose write is not acknowledged yet
+        self._in_flight: List[Dict[tuple, Dict[str, float]]] = []
+        self._flushes = 0  # acknowledged writes, to spot totals read across one
+        # user_id -> (day, tokens, cost_usd, fetched_at): stored totals for budget checks
+        self._stored_totals: Dict[str, tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, source: str, model: str, prompt_tokens: int, completion_tokens: int):
+        prompt_tokens, completion_tokens = prompt_tokens or 0, completion_tokens or 0
+        llm_tokens.inc(prompt_tokens, source=source, model=model, kind="prompt")
+        llm_tokens.inc(completion_tokens, source=source, model=model, kind="completion")
+
+        billed_to = usage_context.get() or {}
+        key = (billed_to.get("user_id"), utc_day(), billed_to.get("thread_id"), source, model)
+        counters = self._pending.setdefault(
+            key, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "requests": 0, "cost_usd": 0.0}
+        )
+        counters["prompt_tokens"] += prompt_tokens
+        counters["completion_tokens"] += completion_tokens
+        counters["total_tokens"] += prompt_tokens + completion_tokens
+        counters["requests"] += 1
+        counters["cost_usd"] += estimate_cost(model, prompt_tokens, completion_tokens)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                # A fresh context: flushes must not log under the request that started them
+                self._flush_task = asyncio.get_running_loop().create_task(
+                    self._flush_loop(), context=contextvars.Context()
+                )
+            except RuntimeError:
+                pass  # no loop (e.g. a script): flush() must be called explicitly
+
+    async def start(self):
+        """Start the periodic flush. Called from the app lifespan."""
+        self._ensure_flusher()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(USAGE_FLUSH_SECONDS)
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        from pymongo import UpdateOne
+
+        batch, self._pending = self._pending, {}
+        self._in_flight.append(batch)
+        started = time.monotonic()
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "day": day, "thread_id": thread_id, "source": source, "model": model},
+                {"$inc": counters, "$set": {"updated_at": now}},
+                upsert=True,
+            )
+            for (user_id, day, thread_id, source, model), counters in batch.items()
+        ]
+        try:
+            await asyncio.to_thread(get_usage_collection().bulk_write, operations, ordered=False)
+        except Exception as e:
+            logger.error("Failed to write %d usage records, will retry: %s", len(operations), e)
+            self._in_flight.remove(batch)
+            for key, counters in batch.items():
+                merged = self._pending.setdefault(key, dict.fromkeys(counters, 0))
+                for name, value in counters.items():
+                    merged[name] += value
+            return
+        except BaseException:
+            # Cancelled at shutdown; the worker thread still completes the write
+            self._in_flight.remove(batch)
+            raise
+
+        self._in_flight.remove(batch)
+        self._flushes += 1
+        # Keep cached budget totals in step with what was just stored
+        for (user_id, day, _, _, _), counters in batch.items():
+            stored = self._stored_totals.get(user_id)
+            if not stored or stored[0] != day:
+                continue
+            if stored[3] >= started:
+                # Read while the write was in progress; it may or may not include it
+                del self._stored_totals[user_id]
+                continue
+            self._stored_totals[user_id] = (
+                day, stored[1] + counters["total_tokens"], stored[2] + counters["cost_usd"], stored[3],
+            )
+
+    async def _stored_daily_totals(self, user_id: str, day: str) -> Tuple[float, float]:
+        stored = self._stored_totals.get(user_id)
+        if stored and stored[0] == day and time.monotonic() - stored[3] < USAGE_TOTALS_CACHE_SECONDS:
+            return stored[1], stored[2]
+
+        def query():
+            rows = list(get_usage_collection().aggregate([
+                {"$match": {"user_id": user_id, "day": day}},
+                {"$group": {"_id": None, "tokens": {"$sum": "$total_tokens"}, "cost": {"$sum": "$cost_usd"}}},
+            ]))
+            return (rows[0]["tokens"], rows[0]["cost"]) if rows else (0, 0.0)
+
+        asked, flushes = time.monotonic(), self._flushes
+        tokens, cost = await asyncio.to_thread(query)
+        if flushes != self._flushes:
+            return tokens, cost  # a write finished meanwhile: don't cache what may predate it
+        if len(self._stored_totals) > 10000:
+            self._stored_totals.clear()
+        self._stored_totals[user_id] = (day, tokens, cost, asked)
+        return tokens, cost
+
+    async def daily_totals(self, user_id: str) -> Tuple[float, float]:
+        """Tokens and cost billed to the user today, including usage not yet flushed.
+
+        Batches being written count until the write is acknowledged; a stored
+        total read meanwhile may already include them, which errs towards
+        refusing rather than admitting a request over budget.
+        """
+        day = utc_day()
+        tokens, cost = await self._stored_daily_totals(user_id, day)
+        for buffer in (self._pending, *self._in_flight):
+            for (buffered_user, buffered_day, _, _, _), counters in buffer.items():
+                if buffered_user == user_id and buffered_day == day:
+                    tokens += counters["total_tokens"]
+                    cost += counters["cost_usd"]
+        return tokens, cost
+
+    async def check_budget(self, user_id: str):
+        """Raise a 429 ``HTTPException`` if the user has spent today's budget."""
+        if not USAGE_DAILY_TOKEN_BUDGET and not USAGE_DAILY_COST_BUDGET_USD:
+            return
+        tokens, cost = await self.daily_totals(user_id)
+        if ((USAGE_DAILY_TOKEN_BUDGET and tokens >= USAGE_DAILY_TOKEN_BUDGET)
+                or (USAGE_DAILY_COST_BUDGET_USD and cost >= USAGE_DAILY_COST_BUDGET_USD)):
+            usage_budget_rejected.inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Daily usage budget exceeded, please try again tomorrow",
+                headers={"Retry-After": str(max(1, math.ceil(seconds_until_utc_midnight())))},
+            )
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+usage_recorder = UsageRecorder()
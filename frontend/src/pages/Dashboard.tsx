@@ -31,18 +31,29 @@ import { useNavigate } from "react-router-dom";
 import { useToast } from "@/hooks/use-toast";
 
 interface Student {
+  _id: string;
   id: number;
   name: string;
   email: string;
   department: string;
 }
 
+interface StudentEvent {
+  op: "insert" | "update" | "delete";
+  id: string; // the student's _id
+  student?: Student;
+}
+
 interface DashboardStats {
   totalStudents: number;
   departments: { [key: string]: number };
   recentStudents: Student[];
 }
 
+// Reconnect delay for the student events stream: doubles after each failure, up to the max
+const EVENTS_RETRY_MIN_MS = 1000;
+const EVENTS_RETRY_MAX_MS = 30000;
+
 const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8', '#82CA9D'];
 
 export const Dashboard = () => {
@@ -62,12 +73,124 @@ export const Dashboard = () => {
     if (!token) {
       console.log("No token found, redirecting to login");
       navigate("/");
-      return;
     }
-    console.log("Token found, fetching student data");
-    fetchStudentData();
   }, [token]);
 
+  // Subscribe to pushed roster changes instead of re-downloading the list.
+  // The roster is fetched once the stream is ready (on every reconnect too, so
+  // changes made while disconnected are not lost); it is only fetched directly
+  // when the stream cannot connect at all. The stream reconnects with backoff.
+  useEffect(() => {
+    if (!token) return;
+    const controller = new AbortController();
+    let retryDelay = EVENTS_RETRY_MIN_MS;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let rosterLoaded = false;
+
+    const scheduleReconnect = () => {
+      if (controller.signal.aborted) return;
+      if (!rosterLoaded) {
+        // Never got as far as 'ready': show the roster without live updates for now
+        rosterLoaded = true;
+        fetchStudentData();
+      }
+      console.warn(`Student events stream closed, reconnecting in ${retryDelay / 1000}s`);
+      retryTimer = setTimeout(subscribe, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, EVENTS_RETRY_MAX_MS);
+    };
+
+    const subscribe = async () => {
+      try {
+        const response = await fetch("http://127.0.0.1:8000/students/events", {
+          headers: { Authorization: `Bearer ${token}` },
+          signal: controller.signal,
+        });
+        if (response.status === 401) {
+          localStorage.removeItem("token");
+          navigate("/");
+          return;
+        }
+        if (!response.ok || !response.body) {
+          console.error("Student events stream failed:", response.status);
+          scheduleReconnect();
+          return;
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split('\n');
+          buffer = lines.pop() || "";
+
+          for (const line of lines) {
+            if (!line.startsWith('data: ')) continue;
+            const data = JSON.parse(line.slice(6));
+            if (data.type === 'ready') {
+              // Subscribed: from here on changes arrive as diffs
+              retryDelay = EVENTS_RETRY_MIN_MS;
+              rosterLoaded = true;
+              fetchStudentData();
+            } else if (data.type === 'diff') {
+              applyStudentEvents(data.events);
+            } else if (data.type === 'resync') {
+              fetchStudentData();
+            }
+          }
+        }
+      } catch (error) {
+        if (!controller.signal.aborted) {
+          console.error("Student events stream error:", error);
+        }
+      }
+      scheduleReconnect();
+    };
+
+    subscribe();
+    return () => {
+      controller.abort();
+      clearTimeout(retryTimer);
+    };
+  }, [token]);
+
+  // Keep the dashboard statistics in sync with the local roster
+  useEffect(() => {
+    const departments: { [key: string]: number } = {};
+    students.forEach((student) => {
+      departments[student.department] = (departments[student.department] || 0) + 1;
+    });
+
+    setStats({
+      totalStudents: students.length,
+      departments,
+      recentStudents: students.slice(-5) // Last 5 students
+    });
+  }, [students]);
+
+  const applyStudentEvents = (events: StudentEvent[]) => {
+    setStudents((prev) => {
+      const next = [...prev];
+      for (const event of events) {
+        const index = next.findIndex((student) => student._id === event.id);
+        if (event.op === "delete") {
+          if (index !== -1) next.splice(index, 1);
+        } else if (event.student) {
+          if (index === -1) {
+            next.push(event.student);
+          } else {
+            next[index] = event.student;
+          }
+        }
+      }
+      return next;
+    });
+  };
+
   const testAuth = async () => {
     try {
       console.log("Testing authentication...");
@@ -133,18 +256,6 @@ export const Dashboard = () => {
       const studentsData = data.Data || [];
       
       setStudents(studentsData);
-      
-      // Calculate statistics
-      const departments: { [key: string]: number } = {};
-      studentsData.forEach((student: Student) => {
-        departments[student.department] = (departments[student.department] || 0) + 1;
-      });
-
-      setStats({
-        totalStudents: studentsData.length,
-        departments,
-        recentStudents: studentsData.slice(-5) // Last 5 students
-      });
 
     } catch (error: any) {
       console.error("Error fetching student data:", error);